@@ -1,28 +1,49 @@
 import os
 import io
+import base64
 import threading
-import sqlite3
+import time
 import datetime
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from flask import Flask, render_template, request, jsonify, send_file, abort
-from model import train_model_background, extract_embedding_for_image, MODEL_PATH
-from attendance_utils import mark_attendance
-
-APP_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(APP_DIR, "attendance.db")
+import click
+from flask import Flask, render_template, request, jsonify, g, Response
+from model import (train_model_background, extract_embeddings_for_image,
+                   recognize_embeddings, enroll_student_images, remove_student_from_gallery)
+from attendance_utils import (mark_attendance, init_unique_constraint,
+                              daily_attendance_counts, rebuild_daily_rollup, attendance_total)
+from student_directory import student_directory, init_schema as init_student_directory_schema
+from email_jobs import email_jobs
+from training_status import TrainingStatus
+import metrics
+from metrics import RECOGNIZE_STAGE_SECONDS, RECOGNIZE_REQUEST_SECONDS, RECOGNIZE_RESULTS, RECOGNIZE_CACHE
+from result_cache import result_cache, fingerprint
+from video_streaming import video_bp, STREAM_DETECTOR_BACKEND
+import db
+from db import APP_DIR
+
 DATASET_DIR = os.path.join(APP_DIR, "dataset")
 os.makedirs(DATASET_DIR, exist_ok=True)
 
 TRAIN_STATUS_FILE = os.path.join(APP_DIR, "train_status.json")
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.register_blueprint(video_bp)
 
 # ---------- DB helpers ----------
+def get_db():
+    # one pooled connection per request, returned to the pool on teardown
+    if "db_conn" not in g:
+        g.db_conn = db.acquire()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        db.release(conn)
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.acquire()
     c = conn.cursor()
     c.execute("""CREATE TABLE IF NOT EXISTS students (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,7 +59,8 @@ def init_db():
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     student_id INTEGER,
                     name TEXT,
-                    timestamp TEXT
+                    timestamp TEXT,
+                    attendance_date TEXT
                 )""")
     
     # Add email column if it doesn't exist (for existing databases)
@@ -48,26 +70,27 @@ def init_db():
         c.execute("ALTER TABLE students ADD COLUMN email TEXT")
         print("Added email column to students table")
     
+    # version counter + triggers used by the in-process student directory cache
+    init_student_directory_schema(c)
+    
     conn.commit()
-    conn.close()
+    db.release(conn)
+    
+    # attendance_date column/indexes + unique (student_id, attendance_date) index
+    init_unique_constraint()
 
 init_db()
+# warm the id -> name cache so recognition never hits the DB for names
+student_directory.warm()
 
-# ---------- Train status helpers ----------
-def write_train_status(status_dict):
-    with open(TRAIN_STATUS_FILE, "w") as f:
-        json.dump(status_dict, f)
-
-def read_train_status():
-    if not os.path.exists(TRAIN_STATUS_FILE):
-        return {"running": False, "progress": 0, "message": "Not trained"}
-    with open(TRAIN_STATUS_FILE, "r") as f:
-        return json.load(f)
-
-# ensure initial train status file exists
-write_train_status({"running": False, "progress": 0, "message": "No training yet."})
+# ---------- Train status ----------
+# in memory; train_status.json is only written when a run starts and ends
+training_status = TrainingStatus(TRAIN_STATUS_FILE)
+TRAIN_STREAM_HEARTBEAT_SEC = 15
+TRAIN_STREAM_POLL_SEC = 1.0  # how often a stream re-checks runs owned by another worker
 
 # ---------- Bulk Email Notification System ----------
+# Sending runs as a background job (see email_jobs.py); poll the status URL.
 @app.route("/send_emails", methods=["POST"])
 def send_bulk_emails():
     try:
@@ -83,120 +106,34 @@ def send_bulk_emails():
         except ValueError:
             return jsonify({"success": False, "message": "Invalid date format. Use YYYY-MM-DD"}), 400
         
-        # Email credentials
-        HOST_EMAIL = "h40313459@gmail.com"
-        HOST_PASSWORD = "ivbw bape rokz bxbq"
-        
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM students WHERE email IS NOT NULL AND email != ''")
+        total = c.fetchone()[0]
         
-        # Fetch all students
-        c.execute("SELECT id, name, email FROM students WHERE email IS NOT NULL AND email != ''")
-        students = c.fetchall()
-        
-        if not students:
+        if not total:
             return jsonify({"success": False, "message": "No students with email addresses found"}), 400
         
-        emails_sent = 0
-        emails_failed = 0
-        
-        # Connect to Gmail SMTP
-        try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(HOST_EMAIL, HOST_PASSWORD)
-            
-            for student_id, student_name, student_email in students:
-                try:
-                    # Check attendance for this student on the selected date
-                    c.execute("SELECT timestamp FROM attendance WHERE student_id = ? AND date(timestamp) = ?", 
-                              (student_id, target_date))
-                    attendance_record = c.fetchone()
-                    
-                    if attendance_record:
-                        # Student was present
-                        subject = f"Attendance Alert: PRESENT - {student_name} - {target_date}"
-                        body = f"""Dear Parent/Student,
-
-This is to inform you that {student_name} was marked PRESENT on {target_date}.
-
-Attendance Details:
-• Student Name: {student_name}
-• Date: {target_date}
-• Status: PRESENT
-• Marked At: {attendance_record[0]}
-
-Thank you for your attention to this matter.
-
-Best regards,
-Digital Attendance System"""
-                        
-                        status = "PRESENT"
-                    else:
-                        # Student was absent
-                        subject = f"Attendance Alert: ABSENT - {student_name} - {target_date}"
-                        body = f"""Dear Parent/Student,
-
-This is to inform you that {student_name} was marked ABSENT on {target_date}.
-
-Attendance Details:
-• Student Name: {student_name}
-• Date: {target_date}
-• Status: ABSENT
-• Note: No attendance record found for this date
-
-Please contact the school administration if you believe this is an error.
-
-Best regards,
-Digital Attendance System"""
-                        
-                        status = "ABSENT"
-                    
-                    # Create and send email
-                    msg = MIMEMultipart()
-                    msg['From'] = HOST_EMAIL
-                    msg['To'] = student_email
-                    msg['Subject'] = subject
-                    
-                    msg.attach(MIMEText(body, 'plain'))
-                    
-                    server.send_message(msg)
-                    emails_sent += 1
-                    
-                    print(f"Email sent to {student_name} ({student_email}) - Status: {status}")
-                    
-                except Exception as e:
-                    emails_failed += 1
-                    print(f"Failed to send email to {student_name} ({student_email}): {str(e)}")
-                    continue
-            
-            server.quit()
-            
-        except Exception as e:
-            return jsonify({"success": False, "message": f"Email server error: {str(e)}"}), 500
-        
-        finally:
-            conn.close()
-        
-        # Return results
-        message = f"Email notification completed! ✅\n\n"
-        message += f"📧 Emails Sent: {emails_sent}\n"
-        if emails_failed > 0:
-            message += f"❌ Emails Failed: {emails_failed}\n"
-        message += f"📅 Date: {target_date}"
-        
+        job = email_jobs.submit(target_date)
         return jsonify({
-            "success": True, 
-            "message": message,
-            "emails_sent": emails_sent,
-            "emails_failed": emails_failed,
-            "total_students": len(students)
-        })
+            "success": True,
+            "job_id": job.id,
+            "status_url": f"/send_emails/{job.id}",
+            "total_students": total,
+            "message": f"Email job queued for {total} student(s) on {target_date}"
+        }), 202
         
     except Exception as e:
         print(f"Bulk email error: {str(e)}")
         return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
 
+@app.route("/send_emails/<job_id>", methods=["GET"])
+def send_emails_status(job_id):
+    job = email_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job id"}), 404
+    return jsonify(job.to_dict())
+
 # ---------- Routes ----------
 @app.route("/")
 def index():
@@ -205,20 +142,37 @@ def index():
 # Dashboard simple API for attendance stats (last 30 days)
 @app.route("/attendance_stats")
 def attendance_stats():
-    import pandas as pd
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT timestamp FROM attendance", conn)
-    conn.close()
-    if df.empty:
-        from datetime import date, timedelta
-        days = [(date.today() - datetime.timedelta(days=i)).strftime("%d-%b") for i in range(29, -1, -1)]
-        return jsonify({"dates": days, "counts": [0]*30})
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
+    # one indexed range read of the daily rollup (see attendance_utils.init_daily_rollup)
     last_30 = [ (datetime.date.today() - datetime.timedelta(days=i)) for i in range(29, -1, -1) ]
-    counts = [ int(df[df['date'] == d].shape[0]) for d in last_30 ]
+    by_day = daily_attendance_counts(last_30[0].isoformat(), last_30[-1].isoformat())
+    counts = [ int(by_day.get(d.isoformat(), 0)) for d in last_30 ]
     dates = [ d.strftime("%d-%b") for d in last_30 ]
     return jsonify({"dates": dates, "counts": counts})
 
+# -------- Prometheus metrics (see metrics.py) --------
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.cli.command("rebuild-daily-counts")
+def rebuild_daily_counts_command():
+    """Recompute the daily_attendance_counts rollup from the attendance table."""
+    days = rebuild_daily_rollup()
+    print(f"Rebuilt daily attendance counts for {days} day(s)")
+
+@app.cli.command("ingest-recordings")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--stride", default=1, show_default=True, help="Process every Nth frame.")
+@click.option("--date", "attendance_date", default=None, help="Attendance date (YYYY-MM-DD), default today.")
+@click.option("--backend", default=None, type=click.Choice(["haar", "mediapipe"]), help="Face detector backend.")
+def ingest_recordings_command(paths, stride, attendance_date, backend):
+    """Mark attendance from recorded videos or frame-image directories (headless)."""
+    from offline_ingest import ingest_paths
+    if not _validate_attendance_date(attendance_date):
+        raise click.BadParameter("use YYYY-MM-DD", param_hint="--date")
+    ingest_paths(list(paths), stride=max(1, stride), attendance_date=attendance_date,
+                 detector_backend=backend or STREAM_DETECTOR_BACKEND)
+
 # -------- Add student (form) --------
 @app.route("/add_student", methods=["GET", "POST"])
 def add_student():
@@ -243,14 +197,14 @@ def add_student():
     if not re.match(email_pattern, email):
         return jsonify({"error":"invalid email format"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     now = datetime.datetime.utcnow().isoformat()
     c.execute("INSERT INTO students (name, email, roll, class, section, reg_no, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
               (name, email, roll, cls, sec, reg_no, now))
     sid = c.lastrowid
     conn.commit()
-    conn.close()
+    student_directory.put(sid, name)
     # create dataset folder for this student
     os.makedirs(os.path.join(DATASET_DIR, str(sid)), exist_ok=True)
     return jsonify({"student_id": sid})
@@ -263,6 +217,7 @@ def upload_face():
         return jsonify({"error":"student_id required"}), 400
     files = request.files.getlist("images[]")
     saved = 0
+    saved_paths = []
     folder = os.path.join(DATASET_DIR, student_id)
     if not os.path.isdir(folder):
         os.makedirs(folder, exist_ok=True)
@@ -272,39 +227,123 @@ def upload_face():
             path = os.path.join(folder, fname)
             f.save(path)
             saved += 1
+            saved_paths.append(path)
         except Exception as e:
             app.logger.error("save error: %s", e)
-    return jsonify({"saved": saved})
+    # enroll into the nearest-neighbour gallery right away (no retrain needed)
+    enrolled = 0
+    try:
+        enrolled = enroll_student_images(int(student_id), saved_paths)
+    except Exception as e:
+        app.logger.error("gallery enroll error: %s", e)
+    return jsonify({"saved": saved, "enrolled": enrolled})
 
 # -------- Train model (start background thread) --------
 @app.route("/train_model", methods=["GET"])
 def train_model_route():
-    # if already running, respond accordingly
-    status = read_train_status()
-    if status.get("running"):
-        return jsonify({"status":"already_running"}), 202
-    # reset status
-    write_train_status({"running": True, "progress": 0, "message": "Starting training"})
-    # start background thread with proper status reset on completion
-    def progress_callback(p, m):
-        is_complete = (p >= 100) or ("error" in m.lower()) or ("not found" in m.lower()) or ("no training" in m.lower())
-        write_train_status({"running": not is_complete, "progress": p, "message": m})
-    
-    t = threading.Thread(target=train_model_background, args=(DATASET_DIR, progress_callback))
+    # start() holds a cross-process lock, so two clicks (or two workers) can't launch two runs
+    run_id = training_status.start()
+    if run_id is None:
+        return jsonify({"status":"already_running", "run_id": training_status.snapshot().get("run_id")}), 202
+    def run():
+        try:
+            train_model_background(DATASET_DIR, training_status.update)
+        finally:
+            # e.g. "No students found" is not a final status by itself
+            training_status.finish()
+    t = threading.Thread(target=run)
     t.daemon = True
     t.start()
-    return jsonify({"status":"started"}), 202
+    return jsonify({"status":"started", "run_id": run_id}), 202
 
-# -------- Train progress (polling) --------
+# -------- Train progress --------
 @app.route("/train_status", methods=["GET"])
 def train_status():
-    return jsonify(read_train_status())
+    return jsonify(training_status.snapshot())
+
+@app.route("/train_status/stream", methods=["GET"])
+def train_status_stream():
+    """Server-Sent Events: the current status at once, then every change as it happens."""
+    def events():
+        version, sent = training_status.current()
+        yield f"retry: 3000\ndata: {json.dumps(sent)}\n\n"
+        quiet = 0.0
+        while True:
+            # wakes on local progress at once; runs in other workers show up via the
+            # durable record, re-read every TRAIN_STREAM_POLL_SEC
+            version, state = training_status.wait_for_change(version, TRAIN_STREAM_POLL_SEC)
+            if state != sent:
+                sent, quiet = state, 0.0
+                yield f"data: {json.dumps(state)}\n\n"
+                continue
+            quiet += TRAIN_STREAM_POLL_SEC
+            if quiet >= TRAIN_STREAM_HEARTBEAT_SEC:
+                quiet = 0.0
+                yield ": keepalive\n\n"  # also how a closed connection gets noticed
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # -------- Mark attendance page --------
 @app.route("/mark_attendance", methods=["GET"])
 def mark_attendance_page():
     return render_template("mark_attendance.html")
 
+# -------- Recognition helpers --------
+def _validate_attendance_date(attendance_date):
+    if not attendance_date:
+        return True
+    try:
+        datetime.datetime.strptime(attendance_date, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+def _recognize_face_groups(groups, attendance_date=None, timings=None):
+    """
+    groups: one [(box, embedding), ...] list per image.
+    All embeddings are stacked and predicted in a single call; every recognized
+    face marks attendance. Returns (error message or None, per-image face dicts).
+    timings (optional dict) gets seconds spent in "predict", "name_lookup" and
+    "mark_attendance".
+    """
+    timings = {} if timings is None else timings
+    embs = [emb for faces in groups for _, emb in faces]
+    if not embs:
+        return None, [[] for _ in groups]
+    started = time.perf_counter()
+    error, predictions = recognize_embeddings(embs)
+    timings["predict"] = timings.get("predict", 0.0) + time.perf_counter() - started
+    if error:
+        return error, None
+    
+    date_label = attendance_date if attendance_date and attendance_date != datetime.date.today().isoformat() else "today"
+    results = []
+    i = 0
+    for faces in groups:
+        image_results = []
+        for box, _ in faces:
+            pred_label, conf = predictions[i]
+            i += 1
+            face = {"box": list(box), "recognized": pred_label is not None, "confidence": float(conf)}
+            if pred_label is not None:
+                # find student name (in-memory directory, no DB round-trip)
+                started = time.perf_counter()
+                name = student_directory.get_name(pred_label) or "Unknown"
+                looked_up = time.perf_counter()
+                
+                # mark attendance for specified date (prevents duplicates for that date)
+                attendance_marked = mark_attendance(int(pred_label), name, attendance_date if attendance_date else None)
+                timings["name_lookup"] = timings.get("name_lookup", 0.0) + looked_up - started
+                timings["mark_attendance"] = timings.get("mark_attendance", 0.0) + time.perf_counter() - looked_up
+                if attendance_marked:
+                    print(f"Attendance marked for {name} (ID: {pred_label}) for {date_label}")
+                else:
+                    print(f"Attendance already exists for {name} (ID: {pred_label}) for {date_label}")
+                face.update({"student_id": int(pred_label), "name": name, "attendance_marked": attendance_marked})
+            image_results.append(face)
+        results.append(image_results)
+    return None, results
+
 # -------- Recognize face endpoint (POST image) --------
 @app.route("/recognize_face", methods=["POST"])
 def recognize_face():
@@ -314,45 +353,92 @@ def recognize_face():
     attendance_date = request.form.get("attendance_date", "").strip()
     
     # Validate attendance_date format if provided
-    if attendance_date:
-        try:
-            # Validate date format
-            datetime.datetime.strptime(attendance_date, "%Y-%m-%d")
-        except ValueError:
-            return jsonify({"recognized": False, "error":"invalid date format. Use YYYY-MM-DD"}), 400
+    if not _validate_attendance_date(attendance_date):
+        return jsonify({"recognized": False, "error":"invalid date format. Use YYYY-MM-DD"}), 400
     
+    started = time.perf_counter()
+    timings = {}
+    outcome = "error"
     try:
-        emb = extract_embedding_for_image(img_file.stream)
-        if emb is None:
-            return jsonify({"recognized": False, "error":"no face detected"}), 200
-        # attempt prediction
-        from model import load_model_if_exists, predict_with_model
-        clf = load_model_if_exists()
-        if clf is None:
-            return jsonify({"recognized": False, "error":"model not trained"}), 200
-        pred_label, conf = predict_with_model(clf, emb)
-        # threshold confidence
-        if conf < 0.5:
-            return jsonify({"recognized": False, "confidence": float(conf)}), 200
-        # find student name
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT name FROM students WHERE id=?", (int(pred_label),))
-        row = c.fetchone()
-        name = row[0] if row else "Unknown"
-        conn.close()
-        
-        # mark attendance for specified date (prevents duplicates for that date)
-        attendance_marked = mark_attendance(int(pred_label), name, attendance_date if attendance_date else None)
-        date_label = attendance_date if attendance_date and attendance_date != datetime.date.today().isoformat() else "today"
-        if attendance_marked:
-            print(f"Attendance marked for {name} (ID: {pred_label}) for {date_label}")
-        else:
-            print(f"Attendance already exists for {name} (ID: {pred_label}) for {date_label}")
-        return jsonify({"recognized": True, "student_id": int(pred_label), "name": name, "confidence": float(conf)}), 200
+        data = img_file.stream.read()
+        # an unchanged kiosk frame gets the client's previous result (see result_cache.py);
+        # only callers identifying themselves with client_id are cached
+        client = request.form.get("client_id", "").strip()
+        fp = None
+        if result_cache.enabled and client:
+            fp = fingerprint(data)
+            cached = result_cache.lookup(client, fp, data, attendance_date)
+            timings["cache_lookup"] = time.perf_counter() - started
+            RECOGNIZE_CACHE.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                outcome, body = cached
+                return jsonify(body), 200
+        outcome, body, status, embeddings = _recognize_single_image(data, attendance_date, timings)
+        if fp is not None and status == 200 and outcome != "error":
+            result_cache.store(client, fp, embeddings, attendance_date, outcome, body)
+        return jsonify(body), status
     except Exception as e:
         app.logger.exception("recognize error")
         return jsonify({"recognized": False, "error": str(e)}), 500
+    finally:
+        RECOGNIZE_RESULTS.inc(result=outcome)
+        RECOGNIZE_REQUEST_SECONDS.observe(time.perf_counter() - started)
+        for stage, seconds in timings.items():
+            RECOGNIZE_STAGE_SECONDS.observe(seconds, stage=stage)
+
+def _recognize_single_image(data, attendance_date, timings):
+    # full decode -> detect -> embed -> predict -> mark
+    # returns (outcome, body, status, face embeddings in body["faces"] order)
+    faces = extract_embeddings_for_image(io.BytesIO(data), timings)
+    if not faces:
+        return "no_face", {"recognized": False, "error":"no face detected"}, 200, []
+    embeddings = [emb for _, emb in faces]
+    error, results = _recognize_face_groups([faces], attendance_date, timings)
+    if error:
+        return "error", {"recognized": False, "error": error}, 200, embeddings
+    faces_out = results[0]
+    recognized = [f for f in faces_out if f["recognized"]]
+    if not recognized:
+        best = max(f["confidence"] for f in faces_out)
+        return "unrecognized", {"recognized": False, "confidence": best, "faces": faces_out}, 200, embeddings
+    # top-level fields describe the most confident match (single-face clients)
+    best = max(recognized, key=lambda f: f["confidence"])
+    return "recognized", {"recognized": True, "student_id": best["student_id"], "name": best["name"],
+                          "confidence": best["confidence"], "faces": faces_out}, 200, embeddings
+
+# -------- Batch recognition (several images, one request) --------
+@app.route("/recognize_batch", methods=["POST"])
+def recognize_batch():
+    files = request.files.getlist("images[]")
+    if not files:
+        return jsonify({"error":"no images"}), 400
+    attendance_date = request.form.get("attendance_date", "").strip()
+    if not _validate_attendance_date(attendance_date):
+        return jsonify({"error":"invalid date format. Use YYYY-MM-DD"}), 400
+    
+    try:
+        groups = []
+        decoded = []
+        for f in files:
+            faces = extract_embeddings_for_image(f.stream)
+            decoded.append(faces is not None)
+            groups.append(faces or [])
+        error, results = _recognize_face_groups(groups, attendance_date)
+        if error:
+            return jsonify({"error": error}), 200
+        images = []
+        for idx, (f, ok, faces_out) in enumerate(zip(files, decoded, results)):
+            entry = {"index": idx, "filename": f.filename, "faces": faces_out}
+            if not ok:
+                entry["error"] = "invalid image"
+            elif not faces_out:
+                entry["error"] = "no face detected"
+            images.append(entry)
+        return jsonify({"images": images,
+                        "recognized_count": sum(f["recognized"] for r in results for f in r)}), 200
+    except Exception as e:
+        app.logger.exception("recognize batch error")
+        return jsonify({"error": str(e)}), 500
 
 # -------- Attendance records & filters --------
 @app.route("/attendance_record", methods=["GET"])
@@ -360,7 +446,7 @@ def attendance_record():
     period = request.args.get("period", "all")  # all, daily, weekly, monthly
     view_type = request.args.get("view", "present")  # present, absent
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     
     if view_type == "absent":
@@ -382,13 +468,13 @@ def attendance_record():
         
         # Get present students for the period
         if period == "daily":
-            c.execute("SELECT DISTINCT student_id FROM attendance WHERE date(timestamp) = ?", (target_date,))
+            c.execute("SELECT DISTINCT student_id FROM attendance WHERE attendance_date = ?", (target_date,))
         elif period == "weekly":
-            c.execute("SELECT DISTINCT student_id FROM attendance WHERE date(timestamp) >= ?", (target_date,))
+            c.execute("SELECT DISTINCT student_id FROM attendance WHERE attendance_date >= ?", (target_date,))
         elif period == "monthly":
-            c.execute("SELECT DISTINCT student_id FROM attendance WHERE date(timestamp) >= ?", (target_date,))
+            c.execute("SELECT DISTINCT student_id FROM attendance WHERE attendance_date >= ?", (target_date,))
         else:
-            c.execute("SELECT DISTINCT student_id FROM attendance WHERE date(timestamp) = ?", (target_date,))
+            c.execute("SELECT DISTINCT student_id FROM attendance WHERE attendance_date = ?", (target_date,))
         
         present_ids = set(row[0] for row in c.fetchall())
         
@@ -398,50 +484,195 @@ def attendance_record():
             if student[0] not in present_ids:  # Student ID not in present list
                 absent_records.append(student)
         
-        conn.close()
         return render_template("attendance_record.html", records=absent_records, period=period, view_type=view_type)
     
     else:
-        # Show present students (original functionality)
-        q = "SELECT id, student_id, name, timestamp FROM attendance"
-        params = ()
+        # Show present students: the page loads rows progressively from
+        # /attendance_records; only the total (from the daily rollup) is computed here
+        start = end = None
         if period == "daily":
-            today = datetime.date.today().isoformat()
-            q += " WHERE date(timestamp) = ?"
-            params = (today,)
+            start = end = datetime.date.today().isoformat()
         elif period == "weekly":
             start = (datetime.date.today() - datetime.timedelta(days=7)).isoformat()
-            q += " WHERE date(timestamp) >= ?"
-            params = (start,)
         elif period == "monthly":
             start = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
-            q += " WHERE date(timestamp) >= ?"
-            params = (start,)
-        q += " ORDER BY timestamp DESC LIMIT 5000"
-        c.execute(q, params)
-        rows = c.fetchall()
-        conn.close()
-        return render_template("attendance_record.html", records=rows, period=period, view_type=view_type)
+        total = attendance_total(start, end)
+        return render_template("attendance_record.html", records=[], period=period, view_type=view_type,
+                               present_total=total, filter_start=start or "", filter_end=end or "")
+
+# -------- Attendance records JSON API (keyset pagination) --------
+ATTENDANCE_PAGE_SIZE = 100
+ATTENDANCE_PAGE_MAX = 500
+
+def _encode_cursor(timestamp, record_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, record_id]).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor):
+    timestamp, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return str(timestamp), int(record_id)
+
+@app.route("/attendance_records", methods=["GET"])
+def attendance_records_api():
+    """
+    Newest-first attendance rows, one bounded page at a time.
+    
+    Query args: limit (default 100, max 500), cursor (next_cursor from the
+    previous page), start/end (YYYY-MM-DD, inclusive), student_id, class, section.
+    Pages continue from the last (timestamp, id) seen instead of using OFFSET,
+    so page 1000 costs the same as page 1.
+    """
+    try:
+        filters = _parse_export_filters(request.args)
+        limit = min(max(int(request.args.get("limit", ATTENDANCE_PAGE_SIZE)), 1), ATTENDANCE_PAGE_MAX)
+        student_id = request.args.get("student_id", "").strip()
+        student_id = int(student_id) if student_id else None
+    except ValueError:
+        return jsonify({"error": "invalid filter (dates must be YYYY-MM-DD, limit/student_id integers)"}), 400
+    cursor = request.args.get("cursor", "").strip()
+    
+    where = []
+    params = []
+    if cursor:
+        try:
+            after_ts, after_id = _decode_cursor(cursor)
+        except (ValueError, TypeError):
+            return jsonify({"error": "invalid cursor"}), 400
+        where.append("(a.timestamp, a.id) < (?, ?)")
+        params.extend([after_ts, after_id])
+    if "start" in filters:
+        where.append("a.attendance_date >= ?")
+        params.append(filters["start"])
+    if "end" in filters:
+        where.append("a.attendance_date <= ?")
+        params.append(filters["end"])
+    if student_id is not None:
+        where.append("a.student_id = ?")
+        params.append(student_id)
+    if "class" in filters:
+        where.append("s.class = ?")
+        params.append(filters["class"])
+    if "section" in filters:
+        where.append("s.section = ?")
+        params.append(filters["section"])
+    q = """SELECT a.id, a.student_id, a.name, s.email, s.class, s.section, a.timestamp, a.attendance_date
+           FROM attendance a
+           LEFT JOIN students s ON a.student_id = s.id"""
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY a.timestamp DESC, a.id DESC LIMIT ?"
+    params.append(limit + 1)  # one extra row tells us whether another page exists
+    
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(q, params)
+    rows = c.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    records = [ {"id":r[0],"student_id":r[1],"name":r[2],"email":r[3],"class":r[4],"section":r[5],
+                 "timestamp":r[6],"attendance_date":r[7]} for r in rows ]
+    next_cursor = _encode_cursor(rows[-1][6], rows[-1][0]) if has_more else None
+    return jsonify({"records": records, "next_cursor": next_cursor, "has_more": has_more})
+
+# -------- CSV export helpers --------
+CSV_FETCH_SIZE = 1000  # rows per fetchmany() / per streamed chunk
+
+def _parse_export_filters(args):
+    """start/end (YYYY-MM-DD, inclusive), class and section query args. Raises ValueError."""
+    filters = {}
+    for key in ("start", "end"):
+        value = args.get(key, "").strip()
+        if value:
+            datetime.datetime.strptime(value, "%Y-%m-%d")
+            filters[key] = value
+    for key in ("class", "section"):
+        value = args.get(key, "").strip()
+        if value:
+            filters[key] = value
+    return filters
+
+def _stream_csv(query, params, header, row_fn=None, trailer_fn=None, compress=False):
+    """
+    Generator yielding the CSV export chunk by chunk.
+    
+    Rows are read with fetchmany() on a pooled connection of its own (the
+    response is streamed after the request context is gone) and written with
+    the csv module, so quoting of commas/quotes/newlines in names is correct.
+    row_fn maps a DB row to a CSV row; trailer_fn() returns rows appended at
+    the end (e.g. a summary). With compress=True the output is gzip-encoded.
+    """
+    import csv
+    import zlib
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    
+    def drain():
+        data = buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+        return gz.compress(data) if gz else data
+    
+    writer.writerow(header)
+    with db.pooled_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        while True:
+            rows = c.fetchmany(CSV_FETCH_SIZE)
+            if not rows:
+                break
+            if row_fn:
+                rows = [row_fn(r) for r in rows]
+            writer.writerows(rows)
+            chunk = drain()
+            if chunk:
+                yield chunk
+    if trailer_fn:
+        writer.writerows(trailer_fn())
+    chunk = drain()
+    if gz:
+        chunk += gz.flush()
+    if chunk:
+        yield chunk
+
+def _csv_response(chunks, filename, compress=False):
+    if compress:
+        filename += ".gz"
+    return Response(chunks, mimetype="application/gzip" if compress else "text/csv",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 # -------- CSV download --------
 @app.route("/download_csv", methods=["GET"])
 def download_csv():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""SELECT a.id, a.student_id, s.name, s.email, a.timestamp 
-                 FROM attendance a 
-                 LEFT JOIN students s ON a.student_id = s.id 
-                 ORDER BY a.timestamp DESC""")
-    rows = c.fetchall()
-    conn.close()
-    output = io.StringIO()
-    output.write("id,student_id,name,email,timestamp\n")
-    for r in rows:
-        output.write(f'{r[0]},{r[1]},{r[2]},{r[3]},{r[4]}\n')
-    mem = io.BytesIO()
-    mem.write(output.getvalue().encode("utf-8"))
-    mem.seek(0)
-    return send_file(mem, as_attachment=True, download_name="attendance.csv", mimetype="text/csv")
+    # optional filters: ?start=YYYY-MM-DD&end=YYYY-MM-DD&class=..&section=..&gzip=1
+    try:
+        filters = _parse_export_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    compress = request.args.get("gzip") in ("1", "true", "yes")
+    
+    where = []
+    params = []
+    if "start" in filters:
+        where.append("a.attendance_date >= ?")
+        params.append(filters["start"])
+    if "end" in filters:
+        where.append("a.attendance_date <= ?")
+        params.append(filters["end"])
+    if "class" in filters:
+        where.append("s.class = ?")
+        params.append(filters["class"])
+    if "section" in filters:
+        where.append("s.section = ?")
+        params.append(filters["section"])
+    q = """SELECT a.id, a.student_id, s.name, s.email, a.timestamp 
+           FROM attendance a 
+           LEFT JOIN students s ON a.student_id = s.id"""
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY a.timestamp DESC"
+    
+    chunks = _stream_csv(q, tuple(params), ["id", "student_id", "name", "email", "timestamp"], compress=compress)
+    return _csv_response(chunks, "attendance.csv", compress)
 
 # -------- Daily Attendance CSV with Absent Students --------
 @app.route("/download_daily_attendance", methods=["GET"])
@@ -451,73 +682,56 @@ def download_daily_attendance():
     try:
         # Validate date format
         datetime.datetime.strptime(date_param, "%Y-%m-%d")
+        filters = _parse_export_filters(request.args)
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    compress = request.args.get("gzip") in ("1", "true", "yes")
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    # every registered student with their attendance row for the date, if any
+    q = """SELECT s.id, s.name, s.email, s.roll, s.class, s.section, s.reg_no, a.timestamp
+           FROM students s
+           LEFT JOIN attendance a ON a.student_id = s.id AND a.attendance_date = ?"""
+    params = [date_param]
+    where = []
+    if "class" in filters:
+        where.append("s.class = ?")
+        params.append(filters["class"])
+    if "section" in filters:
+        where.append("s.section = ?")
+        params.append(filters["section"])
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY s.id"
     
-    # Get all registered students
-    c.execute("SELECT id, name, email, roll, class, section, reg_no FROM students ORDER BY id")
-    all_students = c.fetchall()
-    
-    # Get students marked present for the specific date
-    c.execute("""SELECT DISTINCT a.student_id, a.name, a.timestamp
-                 FROM attendance a 
-                 WHERE date(a.timestamp) = ?
-                 ORDER BY a.student_id""", (date_param,))
-    present_students = c.fetchall()
+    totals = {"present": 0, "absent": 0}
     
-    # Create set of present student IDs for quick lookup
-    present_ids = set(row[0] for row in present_students)
-    present_details = {row[0]: {"name": row[1], "timestamp": row[2]} for row in present_students}
-    
-    conn.close()
-    
-    output = io.StringIO()
-    output.write("Student_ID,Name,Email,Roll_No,Class,Section,Reg_No,Status,Attendance_Time\n")
-    
-    absent_count = 0
-    present_count = 0
-    
-    for student in all_students:
-        student_id, name, email, roll, class_name, section, reg_no = student
-        
-        if student_id in present_ids:
+    def row_fn(r):
+        student_id, name, email, roll, class_name, section, reg_no, timestamp = r
+        if timestamp is not None:
             # Student was marked present
-            status = "Present"
-            attendance_time = present_details[student_id]["timestamp"]
-            present_count += 1
+            status, attendance_time = "Present", timestamp
+            totals["present"] += 1
         else:
             # Student was not marked present - mark as absent
-            status = "Absent"
-            attendance_time = "Not marked"
-            absent_count += 1
-        
-        # Properly escape CSV fields
-        name_quoted = f'"{name}"' if name else '""'
-        email_quoted = f'"{email}"' if email else '""'
-        roll_quoted = f'"{roll}"' if roll else '""'
-        class_quoted = f'"{class_name}"' if class_name else '""'
-        section_quoted = f'"{section}"' if section else '""'
-        reg_no_quoted = f'"{reg_no}"' if reg_no else '""'
-        attendance_time_quoted = f'"{attendance_time}"'
-        
-        output.write(f'{student_id},{name_quoted},{email_quoted},{roll_quoted},{class_quoted},{section_quoted},{reg_no_quoted},{status},{attendance_time_quoted}\n')
-    
-    # Add summary at the end
-    output.write(f"\n,,,,,,Summary,,\n")
-    output.write(f",Total Students,{len(all_students)},,,,\n")
-    output.write(f",Present Students,{present_count},,,,,\n")
-    output.write(f",Absent Students,{absent_count},,,,,\n")
-    output.write(f",Date,{date_param},,,,,\n")
+            status, attendance_time = "Absent", "Not marked"
+            totals["absent"] += 1
+        return [student_id, name or "", email or "", roll or "", class_name or "",
+                section or "", reg_no or "", status, attendance_time]
     
-    mem = io.BytesIO()
-    mem.write(output.getvalue().encode("utf-8"))
-    mem.seek(0)
+    def trailer_fn():
+        # summary at the end
+        return [
+            [],
+            ["", "", "", "", "", "", "Summary", "", ""],
+            ["", "Total Students", totals["present"] + totals["absent"]],
+            ["", "Present Students", totals["present"]],
+            ["", "Absent Students", totals["absent"]],
+            ["", "Date", date_param],
+        ]
     
-    filename = f"daily_attendance_{date_param}.csv"
-    return send_file(mem, as_attachment=True, download_name=filename, mimetype="text/csv")
+    header = ["Student_ID", "Name", "Email", "Roll_No", "Class", "Section", "Reg_No", "Status", "Attendance_Time"]
+    chunks = _stream_csv(q, tuple(params), header, row_fn, trailer_fn, compress)
+    return _csv_response(chunks, f"daily_attendance_{date_param}.csv", compress)
 
 # -------- Registered Students Page --------
 @app.route("/registered_students", methods=["GET"])
@@ -535,7 +749,7 @@ def present_students():
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     
     # Get all registered students
@@ -545,7 +759,7 @@ def present_students():
     # Get students marked present for the specific date
     c.execute("""SELECT a.student_id, a.name, a.timestamp
                  FROM attendance a 
-                 WHERE date(a.timestamp) = ?
+                 WHERE a.attendance_date = ?
                  ORDER BY a.timestamp""", (date_param,))
     present_students = c.fetchall()
     
@@ -590,7 +804,6 @@ def present_students():
             })
             absent_count += 1
     
-    conn.close()
     
     return jsonify({
         "date": date_param,
@@ -603,27 +816,27 @@ def present_students():
 # -------- Students API for listing/editing --------
 @app.route("/students", methods=["GET"])
 def students_list():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT id, name, email, roll, class, section, reg_no, created_at FROM students ORDER BY id DESC")
     rows = c.fetchall()
-    conn.close()
     data = [ {"id":r[0],"name":r[1],"email":r[2],"roll":r[3],"class":r[4],"section":r[5],"reg_no":r[6],"created_at":r[7]} for r in rows ]
     return jsonify({"students": data})
 
 @app.route("/students/<int:sid>", methods=["DELETE"])
 def delete_student(sid):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute("DELETE FROM students WHERE id=?", (sid,))
     c.execute("DELETE FROM attendance WHERE student_id=?", (sid,))
     conn.commit()
-    conn.close()
+    student_directory.remove(sid)
     # also delete dataset folder
     folder = os.path.join(DATASET_DIR, str(sid))
     if os.path.isdir(folder):
         import shutil
         shutil.rmtree(folder, ignore_errors=True)
+    remove_student_from_gallery(sid)
     return jsonify({"deleted": True})
 
 # ---------------- run ------------------------
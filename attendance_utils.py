@@ -2,35 +2,179 @@ import sqlite3
 import datetime
 import os
 import threading
+import queue
+import time
+import atexit
+from concurrent.futures import Future
 
-APP_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(APP_DIR, "attendance.db")
+import db
+from db import DB_PATH
+from metrics import ATTENDANCE_MARKS
 
 # Global lock to prevent race conditions
 attendance_lock = threading.Lock()
 
+# "direct": mark_attendance writes under attendance_lock (one transaction per call)
+# "queued": calls go through the single AttendanceWriter thread, which commits
+#           whatever is waiting as one INSERT OR IGNORE batch (group commit)
+ATTENDANCE_WRITE_MODE = os.environ.get("ATTENDANCE_WRITE_MODE", "direct")
+
+def migrate_attendance_date(conn):
+    """
+    One-time migration: materialize attendance.attendance_date (YYYY-MM-DD).
+    
+    Date filters compare this plain column instead of date(timestamp), so they
+    can use the indexes below rather than scanning the table. Existing rows are
+    back-filled from date(timestamp) when the column is added; new rows get it
+    from the insert (or from the trigger, for writers that do not set it), so
+    later startups skip the back-fill.
+    """
+    c = conn.cursor()
+    c.execute("PRAGMA table_info(attendance)")
+    columns = [column[1] for column in c.fetchall()]
+    if not columns:
+        # attendance table not created yet (init_db runs this again afterwards)
+        return False
+    if "attendance_date" not in columns:
+        # column and back-fill in one transaction, so an interrupted migration
+        # is redone in full on the next start
+        if not conn.in_transaction:
+            c.execute("BEGIN")
+        c.execute("ALTER TABLE attendance ADD COLUMN attendance_date TEXT")
+        c.execute("UPDATE attendance SET attendance_date = date(timestamp)")
+        print(f"Added attendance_date column to attendance table ({c.rowcount} rows back-filled)")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_attendance_fill_date AFTER INSERT ON attendance
+                 WHEN NEW.attendance_date IS NULL
+                 BEGIN
+                     UPDATE attendance SET attendance_date = date(NEW.timestamp) WHERE id = NEW.id;
+                 END""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_student ON attendance (attendance_date, student_id)")
+    return True
+
+def init_daily_rollup(conn):
+    """
+    daily_attendance_counts: one row per attendance_date with the number of
+    attendance rows on that date, kept current by triggers on attendance so
+    every writer (mark_attendance, the queued writer, deletes) maintains it.
+    /attendance_stats reads a 30-day range from it instead of the whole table.
+    Built from existing data the first time it is created.
+    """
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_attendance_counts'")
+    exists = c.fetchone() is not None
+    c.execute("""CREATE TABLE IF NOT EXISTS daily_attendance_counts (
+                    attendance_date TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL
+                 )""")
+    # NEW.attendance_date can still be NULL here for writers that only set
+    # timestamp (trg_attendance_fill_date fills it in afterwards)
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_daily_counts_ins AFTER INSERT ON attendance
+                 BEGIN
+                     INSERT INTO daily_attendance_counts (attendance_date, count)
+                     VALUES (COALESCE(NEW.attendance_date, date(NEW.timestamp)), 1)
+                     ON CONFLICT(attendance_date) DO UPDATE SET count = count + 1;
+                 END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_daily_counts_del AFTER DELETE ON attendance
+                 BEGIN
+                     UPDATE daily_attendance_counts SET count = count - 1
+                     WHERE attendance_date = COALESCE(OLD.attendance_date, date(OLD.timestamp));
+                 END""")
+    # the NULL -> date fill-in was already counted by the insert trigger
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_daily_counts_upd AFTER UPDATE OF attendance_date ON attendance
+                 WHEN OLD.attendance_date IS NOT NULL AND NEW.attendance_date IS NOT OLD.attendance_date
+                 BEGIN
+                     UPDATE daily_attendance_counts SET count = count - 1
+                     WHERE attendance_date = OLD.attendance_date;
+                     INSERT INTO daily_attendance_counts (attendance_date, count)
+                     VALUES (NEW.attendance_date, 1)
+                     ON CONFLICT(attendance_date) DO UPDATE SET count = count + 1;
+                 END""")
+    if not exists:
+        _rebuild_daily_rollup(c)
+
+def _rebuild_daily_rollup(c):
+    c.execute("DELETE FROM daily_attendance_counts")
+    c.execute("""INSERT INTO daily_attendance_counts (attendance_date, count)
+                 SELECT attendance_date, COUNT(*) FROM attendance
+                 WHERE attendance_date IS NOT NULL
+                 GROUP BY attendance_date""")
+    return c.rowcount
+
+def rebuild_daily_rollup():
+    """Recompute daily_attendance_counts from the attendance table. Returns number of days."""
+    conn = None
+    try:
+        conn = db.acquire()
+        c = conn.cursor()
+        days = _rebuild_daily_rollup(c)
+        conn.commit()
+        return days
+    finally:
+        if conn:
+            db.release(conn)
+
+def daily_attendance_counts(start_date, end_date):
+    """{date string: count} for start_date..end_date inclusive (ISO date strings)."""
+    conn = None
+    try:
+        conn = db.acquire()
+        c = conn.cursor()
+        c.execute("""SELECT attendance_date, count FROM daily_attendance_counts
+                     WHERE attendance_date BETWEEN ? AND ?""", (start_date, end_date))
+        return dict(c.fetchall())
+    finally:
+        if conn:
+            db.release(conn)
+
+def attendance_total(start_date=None, end_date=None):
+    """Number of attendance rows in an optional inclusive date range, from the rollup."""
+    conn = None
+    try:
+        conn = db.acquire()
+        c = conn.cursor()
+        c.execute("""SELECT COALESCE(SUM(count), 0) FROM daily_attendance_counts
+                     WHERE attendance_date BETWEEN ? AND ?""",
+                  (start_date or "0000-00-00", end_date or "9999-99-99"))
+        return c.fetchone()[0]
+    finally:
+        if conn:
+            db.release(conn)
+
 def init_unique_constraint():
     """Add unique constraint to prevent duplicate attendance entries for same student on same day"""
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.acquire()
         c = conn.cursor()
-        # First drop the index if it exists to recreate properly
+        if not migrate_attendance_date(conn):
+            return
+        # Replace the old expression index on date(timestamp) with a plain
+        # unique index; it also serves (student_id, attendance_date) lookups
         c.execute("DROP INDEX IF EXISTS idx_student_daily_attendance")
-        conn.commit()
-        # Create unique index on student_id and date part of timestamp
-        c.execute("""CREATE UNIQUE INDEX idx_student_daily_attendance 
-                     ON attendance (student_id, date(timestamp))""")
+        c.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_date
+                     ON attendance (student_id, attendance_date)""")
+        # newest-first keyset pagination over (timestamp, id); id is the rowid,
+        # so it is already part of every index entry
+        c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_timestamp ON attendance (timestamp)")
+        init_daily_rollup(conn)
         conn.commit()
     except sqlite3.Error as e:
         print(f"Database error creating constraint: {e}")
     finally:
         if conn:
-            conn.close()
+            db.release(conn)
 
 # Initialize the constraint when module is imported
 init_unique_constraint()
 
+def _attendance_timestamp(target_date):
+    # Create timestamp for the target date (use current time for that date)
+    if target_date == datetime.date.today().isoformat():
+        # For today, use current timestamp
+        return datetime.datetime.utcnow().isoformat()
+    # For other dates, use the date at noon to avoid timezone issues
+    return f"{target_date}T12:00:00.000000"
+
 def mark_attendance(student_id, name, attendance_date=None):
     """
     Mark attendance for a student, preventing duplicate entries for the same day.
@@ -43,59 +187,63 @@ def mark_attendance(student_id, name, attendance_date=None):
     Returns:
         bool: True if attendance was marked, False if already exists or error
     """
+    if ATTENDANCE_WRITE_MODE == "queued":
+        try:
+            return attendance_writer.submit(student_id, name, attendance_date).result()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
     with attendance_lock:
         conn = None
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = db.acquire()
             c = conn.cursor()
             
             # Use provided date or today's date in YYYY-MM-DD format
             target_date = attendance_date if attendance_date else datetime.date.today().isoformat()
             
             # Check if student already has an attendance record for the target date
-            c.execute("SELECT id FROM attendance WHERE student_id = ? AND date(timestamp) = ?", 
+            c.execute("SELECT id FROM attendance WHERE student_id = ? AND attendance_date = ?", 
                       (student_id, target_date))
             existing_record = c.fetchone()
             
             if existing_record:
                 # Student already marked attendance for this date - do nothing
+                ATTENDANCE_MARKS.inc(outcome="duplicate")
                 return False
             else:
                 # No attendance record for target date - insert new record
-                # Create timestamp for the target date (use current time for that date)
-                if target_date == datetime.date.today().isoformat():
-                    # For today, use current timestamp
-                    timestamp = datetime.datetime.utcnow().isoformat()
-                else:
-                    # For other dates, use the date at noon to avoid timezone issues
-                    timestamp = f"{target_date}T12:00:00.000000"
+                timestamp = _attendance_timestamp(target_date)
                 
-                c.execute("INSERT INTO attendance (student_id, name, timestamp) VALUES (?, ?, ?)", 
-                          (student_id, name, timestamp))
+                c.execute("INSERT INTO attendance (student_id, name, timestamp, attendance_date) VALUES (?, ?, ?, ?)", 
+                          (student_id, name, timestamp, target_date))
                 conn.commit()
+                ATTENDANCE_MARKS.inc(outcome="new")
                 return True
             
         except sqlite3.IntegrityError:
             # Unique constraint violated - another thread already inserted
+            ATTENDANCE_MARKS.inc(outcome="duplicate")
             return False
         except sqlite3.Error as e:
             print(f"Database error: {e}")
+            ATTENDANCE_MARKS.inc(outcome="error")
             return False
         finally:
             if conn:
-                conn.close()
+                db.release(conn)
 
 def cleanup_duplicate_attendance():
     """Remove duplicate attendance records, keeping only the earliest entry per student per day"""
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.acquire()
         c = conn.cursor()
         
         # Find duplicates and keep only the earliest entry
         c.execute("""DELETE FROM attendance WHERE id NOT IN (
                      SELECT MIN(id) FROM attendance 
-                     GROUP BY student_id, date(timestamp)
+                     GROUP BY student_id, attendance_date
                  )""")
         deleted_rows = c.rowcount
         conn.commit()
@@ -105,4 +253,121 @@ def cleanup_duplicate_attendance():
         return 0
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            db.release(conn)
+
+class AttendanceWriter:
+    """
+    Single writer thread for write-behind attendance marking.
+    
+    submit() enqueues a request and returns a Future that resolves to True if
+    attendance was newly marked, False if the student already had a record for
+    that date. The writer drains everything waiting (up to max_batch) and
+    inserts it with INSERT OR IGNORE against the unique (student_id, date)
+    index inside a single transaction, so N concurrent kiosks cost one commit
+    instead of N lock hand-offs and N fsyncs.
+    """
+    _STOP = object()
+
+    def __init__(self, db_path=DB_PATH, max_batch=500, max_wait=0.02):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait  # how long to wait for more requests to join a batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, student_id, name, attendance_date=None, callback=None):
+        """Queue an attendance mark. callback(future) runs on the writer thread once committed."""
+        if self._stopped:
+            raise RuntimeError("AttendanceWriter has been stopped")
+        target_date = attendance_date if attendance_date else datetime.date.today().isoformat()
+        fut = Future()
+        if callback is not None:
+            fut.add_done_callback(callback)
+        self._ensure_started()
+        self._queue.put((int(student_id), name, _attendance_timestamp(target_date), target_date, fut))
+        return fut
+
+    def _run(self):
+        # autocommit mode: the batch transaction is opened explicitly in _write_batch
+        conn = db.connect(self.db_path, isolation_level=None)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    self._queue.task_done()
+                    break
+                batch = [item]
+                stop_after = False
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    try:
+                        nxt = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is self._STOP:
+                        stop_after = True
+                        self._queue.task_done()
+                        break
+                    batch.append(nxt)
+                self._write_batch(conn, batch)
+                for _ in batch:
+                    self._queue.task_done()
+                if stop_after:
+                    break
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        results = []
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN")
+            for student_id, name, timestamp, target_date, _ in batch:
+                c.execute("INSERT OR IGNORE INTO attendance (student_id, name, timestamp, attendance_date) "
+                          "VALUES (?, ?, ?, ?)", (student_id, name, timestamp, target_date))
+                results.append(c.rowcount == 1)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Database error writing attendance batch: {e}")
+            ATTENDANCE_MARKS.inc(len(batch), outcome="error")
+            for *_, fut in batch:
+                fut.set_exception(e)
+            return
+        new = sum(results)
+        if new:
+            ATTENDANCE_MARKS.inc(new, outcome="new")
+        if len(results) - new:
+            ATTENDANCE_MARKS.inc(len(results) - new, outcome="duplicate")
+        for (*_, fut), marked in zip(batch, results):
+            fut.set_result(marked)
+
+    def flush(self):
+        """Block until every queued request has been committed."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        """Flush pending writes and stop the writer thread (registered with atexit)."""
+        self._stopped = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+attendance_writer = AttendanceWriter()
+atexit.register(attendance_writer.stop)
+
+def mark_attendance_async(student_id, name, attendance_date=None, callback=None):
+    """Write-behind variant of mark_attendance: returns a Future[bool] instead of blocking."""
+    return attendance_writer.submit(student_id, name, attendance_date, callback)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the recognition and attendance hot paths.
+
+    python benchmark.py                          # run, print JSON results
+    python benchmark.py -o bench.json            # run, save JSON results
+    python benchmark.py --baseline bench.json    # run, compare with a saved run,
+                                                 # exit 1 if anything got slower
+                                                 # than --threshold (default 25%)
+
+Everything runs against synthetic faces (synthetic_faces.py) in a temporary
+directory with its own SQLite DB, model.pkl and gallery.npz, so the real
+attendance.db and dataset/ are never touched.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import datetime
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLD = 0.25
+
+
+def time_calls(fn, repeat, warmup=1, setup=None):
+    """Seconds per call of fn() over `repeat` timed calls; setup() runs untimed before each."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(repeat=50, train_repeat=3, students=20, images_per_student=5):
+    workdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    previous_cwd = os.getcwd()
+    # must be set before the app modules are imported: db.py reads it at import,
+    # model.pkl / gallery.npz are resolved against the working directory
+    os.environ["ATTENDANCE_DB_PATH"] = os.path.join(workdir, "attendance.db")
+    os.environ.setdefault("ATTENDANCE_WRITE_MODE", "direct")
+    # every request must run the full pipeline, never the kiosk result cache
+    os.environ["RESULT_CACHE_TTL"] = "0"
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    try:
+        import cv2
+        import numpy as np
+        import app as app_module
+        import db
+        from face_detector import detect_faces
+        from model import (embed_face, extract_embedding_for_image, predict_with_model,
+                           train_model_background, load_model_if_exists, decode_grayscale, reduction_factor)
+        from attendance_utils import mark_attendance
+        from embedding_cache import CACHE_FILENAME
+        from synthetic_faces import face_jpeg, build_dataset, insert_students
+
+        results = {}
+
+        def record(name, samples):
+            results[name] = summarize(samples)
+            print(f"  {name:<32} median {results[name]['median_ms']:9.3f} ms", file=sys.stderr)
+
+        student_ids = list(range(1, students + 1))
+        dataset_dir = os.path.join(workdir, "dataset")
+        build_dataset(dataset_dir, student_ids, images_per_student)
+        with db.pooled_connection() as conn:
+            insert_students(conn, student_ids)
+
+        # ---- training (cold = no embedding cache, warm = every image cached) ----
+        def clear_caches():
+            for sid in student_ids:
+                cache = os.path.join(dataset_dir, str(sid), CACHE_FILENAME)
+                if os.path.exists(cache):
+                    os.remove(cache)
+
+        record("train_model_cold", time_calls(lambda: train_model_background(dataset_dir), train_repeat,
+                                              warmup=0, setup=clear_caches))
+        record("train_model_warm", time_calls(lambda: train_model_background(dataset_dir), train_repeat))
+        clf = load_model_if_exists()
+        if clf is None:
+            raise RuntimeError("training produced no model")
+
+        # ---- single-image recognition stages ----
+        probe = face_jpeg(student_ids[0], 1000)
+        img = decode_grayscale(probe, reduction_factor(probe))
+        boxes = detect_faces(img)
+        if len(boxes) == 0:
+            raise RuntimeError("no face detected in the synthetic probe image")
+        emb = embed_face(img, boxes[0])
+
+        # same decode as the app: straight to grayscale at the working resolution
+        record("decode", time_calls(lambda: decode_grayscale(probe, reduction_factor(probe)), repeat))
+        record("detect", time_calls(lambda: detect_faces(img), repeat))
+        record("embed", time_calls(lambda: embed_face(img, boxes[0]), repeat))
+        record("extract_embedding_for_image",
+               time_calls(lambda: extract_embedding_for_image(io.BytesIO(probe)), repeat))
+        record("predict_with_model", time_calls(lambda: predict_with_model(clf, emb), repeat))
+
+        # ---- attendance writes ----
+        day = iter(range(10 ** 6))
+        base = datetime.date(2000, 1, 1)
+
+        def mark_new():
+            # a fresh (student, date) pair every call, so every call inserts
+            mark_attendance(student_ids[0], "Student 1", (base + datetime.timedelta(days=next(day))).isoformat())
+
+        record("mark_attendance_new", time_calls(mark_new, repeat))
+        record("mark_attendance_duplicate",
+               time_calls(lambda: mark_attendance(student_ids[0], "Student 1", base.isoformat()), repeat))
+
+        # ---- end to end through the Flask app ----
+        client = app_module.app.test_client()
+
+        def recognize():
+            resp = client.post("/recognize_face", data={"image": (io.BytesIO(probe), "probe.jpg")},
+                               content_type="multipart/form-data")
+            if resp.status_code != 200:
+                raise RuntimeError(f"/recognize_face returned {resp.status_code}")
+
+        record("recognize_face_http", time_calls(recognize, repeat))
+
+        import sklearn
+        meta = {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "repeat": repeat,
+            "train_repeat": train_repeat,
+            "students": students,
+            "images_per_student": images_per_student,
+        }
+        return {"meta": meta, "results": results}
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """{name: {"baseline_ms", "current_ms", "change", "regression"}} on median times."""
+    report = {}
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("median_ms"):
+            continue
+        change = result["median_ms"] / old["median_ms"] - 1.0
+        report[name] = {
+            "baseline_ms": old["median_ms"],
+            "current_ms": result["median_ms"],
+            "change": round(change, 4),
+            "regression": change > threshold,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of a median before it counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per micro-benchmark")
+    parser.add_argument("--train-repeat", type=int, default=3, help="timed training runs")
+    parser.add_argument("--students", type=int, default=20, help="synthetic students in the training set")
+    parser.add_argument("--images", type=int, default=5, help="synthetic images per student")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print("Running benchmarks...", file=sys.stderr)
+    # the app logs with print(); keep stdout clean for the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        output = run_benchmarks(args.repeat, args.train_repeat, args.students, args.images)
+
+    regressions = []
+    if baseline is not None:
+        output["comparison"] = compare(output, baseline, args.threshold)
+        output["comparison_threshold"] = args.threshold
+        print(f"\nAgainst baseline {baseline.get('meta', {}).get('commit') or args.baseline}:", file=sys.stderr)
+        for name, row in output["comparison"].items():
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"  {name:<32} {row['baseline_ms']:9.3f} -> {row['current_ms']:9.3f} ms "
+                  f"({row['change']:+.1%}){flag}", file=sys.stderr)
+            if row["regression"]:
+                regressions.append(name)
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
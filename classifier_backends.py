@@ -0,0 +1,170 @@
+import os
+import time
+import statistics
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# ---- Classifier backends for model.pkl ----
+# Every backend is a scikit-learn estimator with fit / predict_proba / classes_,
+# so whichever one training picks is pickled to model.pkl and served by
+# predict_with_model unchanged. Every training run evaluates candidates on a
+# held-out split (accuracy + single-sample and batched predict latency) before
+# the final fit on all data; by default the only candidate is the backend being
+# served, so each run reports its accuracy and latency without fitting others.
+#
+#   CLASSIFIER_BACKEND=forest        always fit this backend (default: the
+#                                    original 150-tree RandomForest)
+#   CLASSIFIER_BACKEND=auto          fastest candidate whose held-out accuracy
+#                                    reaches CLASSIFIER_ACCURACY_FLOOR
+#   CLASSIFIER_CANDIDATES=knn,lda    backends to compare as well (default: just
+#                                    the served one, or all with auto)
+#
+# "Accuracy" counts a held-out face as right only when the predicted student is
+# correct AND the confidence clears the serving threshold, because that is what
+# recognition actually returns; plain top-1 accuracy is reported alongside.
+
+BACKENDS = {
+    "forest": lambda: RandomForestClassifier(n_estimators=150, n_jobs=-1, random_state=42),
+    "forest_small": lambda: RandomForestClassifier(n_estimators=30, n_jobs=-1, random_state=42),
+    "linear": lambda: make_pipeline(StandardScaler(), LogisticRegression(max_iter=300)),
+    "lda": lambda: LinearDiscriminantAnalysis(),
+    "knn": lambda: KNeighborsClassifier(n_neighbors=3, weights="distance"),
+}
+
+DEFAULT_BACKEND = "forest"
+CLASSIFIER_BACKEND = os.environ.get("CLASSIFIER_BACKEND", DEFAULT_BACKEND)
+CLASSIFIER_CANDIDATES = [name.strip() for name in
+                         os.environ.get("CLASSIFIER_CANDIDATES", "").split(",") if name.strip()]
+CLASSIFIER_ACCURACY_FLOOR = float(os.environ.get("CLASSIFIER_ACCURACY_FLOOR", "0.9"))
+
+HOLDOUT_FRACTION = 0.2
+LATENCY_REPEAT = 20
+LATENCY_BATCH = 32
+
+
+def make_classifier(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown classifier backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def _for_serving(clf):
+    # training fits with every core; serving predicts one request at a time, where
+    # spinning up a joblib pool costs more than the prediction itself
+    if "n_jobs" in clf.get_params():
+        clf.set_params(n_jobs=1)
+    return clf
+
+
+def fit_classifier(name, X, y):
+    """Fit backend `name` on (X, y) and return it configured for serving."""
+    clf = make_classifier(name)
+    clf.fit(X, y)
+    return _for_serving(clf)
+
+
+def holdout_split(y, fraction=HOLDOUT_FRACTION, seed=42):
+    """Boolean test mask holding out ~fraction of each student's samples (none from single-sample students)."""
+    rng = np.random.default_rng(seed)
+    test = np.zeros(len(y), dtype=bool)
+    for label in np.unique(y):
+        idx = np.flatnonzero(y == label)
+        if len(idx) < 2:
+            continue
+        n_test = min(len(idx) - 1, max(1, int(round(len(idx) * fraction))))
+        test[rng.choice(idx, n_test, replace=False)] = True
+    return test
+
+
+def measure_predict(clf, X, repeat=LATENCY_REPEAT, batch=LATENCY_BATCH):
+    """(median seconds for a 1-row predict_proba, seconds per row for a `batch`-row call)."""
+    one = X[:1]
+    rows = X[:batch]
+    clf.predict_proba(one)  # warm-up
+    single = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clf.predict_proba(one)
+        single.append(time.perf_counter() - started)
+    batched = []
+    for _ in range(max(1, repeat // 4)):
+        started = time.perf_counter()
+        clf.predict_proba(rows)
+        batched.append(time.perf_counter() - started)
+    return statistics.median(single), statistics.median(batched) / len(rows)
+
+
+def evaluate_backends(X, y, names, confidence_threshold):
+    """Fit each backend on a held-out split; returns one report dict per backend."""
+    test = holdout_split(y)
+    train = ~test
+    X_eval = X[test] if test.any() else X[train]
+    report = []
+    for name in names:
+        entry = {"backend": name}
+        try:
+            clf = make_classifier(name)
+            started = time.perf_counter()
+            clf.fit(X[train], y[train])
+            entry["fit_sec"] = round(time.perf_counter() - started, 4)
+            _for_serving(clf)
+            if test.any():
+                proba = clf.predict_proba(X[test])
+                best = np.argmax(proba, axis=1)
+                correct = clf.classes_[best] == y[test]
+                accepted = proba[np.arange(len(best)), best] >= confidence_threshold
+                entry["accuracy"] = round(float(np.mean(correct & accepted)), 4)
+                entry["top1_accuracy"] = round(float(np.mean(correct)), 4)
+            else:
+                entry["accuracy"] = entry["top1_accuracy"] = None
+            single, per_row = measure_predict(clf, X_eval)
+            entry["predict_ms"] = round(single * 1000, 4)
+            entry["batch_predict_ms_per_face"] = round(per_row * 1000, 4)
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return {"held_out": int(test.sum()), "trained_on": int(train.sum()), "backends": report}
+
+
+def select_backend(evaluation, floor=CLASSIFIER_ACCURACY_FLOOR):
+    """Fastest single-sample backend meeting the accuracy floor; else the most accurate one."""
+    usable = [b for b in evaluation["backends"] if "error" not in b and b["accuracy"] is not None]
+    if not usable:
+        return DEFAULT_BACKEND
+    passing = [b for b in usable if b["accuracy"] >= floor]
+    if passing:
+        return min(passing, key=lambda b: b["predict_ms"])["backend"]
+    return max(usable, key=lambda b: (b["accuracy"], -b["predict_ms"]))["backend"]
+
+
+def evaluation_candidates(backend, extra=CLASSIFIER_CANDIDATES):
+    """Backends to evaluate in a run serving `backend`: always that one, plus `extra`."""
+    if backend == "auto":
+        return list(extra) or list(BACKENDS)
+    return [backend] + [name for name in extra if name != backend]
+
+
+def backend_accuracy(evaluation, backend):
+    """Held-out accuracy of backend in an evaluate_backends() result, or None."""
+    for entry in (evaluation or {}).get("backends", []):
+        if entry["backend"] == backend and "error" not in entry:
+            return entry["accuracy"]
+    return None
+
+
+def format_evaluation(evaluation):
+    lines = [f"Held-out evaluation ({evaluation['held_out']} faces held out, "
+             f"{evaluation['trained_on']} trained on):"]
+    for b in evaluation["backends"]:
+        if "error" in b:
+            lines.append(f"  {b['backend']:<13} failed: {b['error']}")
+            continue
+        acc = "n/a" if b["accuracy"] is None else f"{b['accuracy']:.1%}"
+        lines.append(f"  {b['backend']:<13} accuracy {acc:>6}  predict {b['predict_ms']:.3f} ms  "
+                     f"batched {b['batch_predict_ms_per_face']:.3f} ms/face  fit {b['fit_sec']:.2f}s")
+    return "\n".join(lines)
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# ---- Shared SQLite connection layer ----
+# Every DB touch point (Flask routes, attendance_utils, the student directory,
+# the video stream) borrows connections from here instead of calling
+# sqlite3.connect() per operation. Connections are configured once with:
+#   - WAL journaling, so readers (records pages, exports) never block the
+#     attendance writers and vice versa
+#   - synchronous=NORMAL, which is durable across application crashes in WAL
+#     mode and avoids an fsync per commit
+#   - a busy timeout, so concurrent writers wait instead of failing with
+#     "database is locked"
+#   - a larger prepared-statement cache; pooled connections live long enough
+#     for the hot queries to stay compiled
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get("ATTENDANCE_DB_PATH", os.path.join(APP_DIR, "attendance.db"))
+
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+STATEMENT_CACHE_SIZE = int(os.environ.get("SQLITE_STATEMENT_CACHE_SIZE", "256"))
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "8"))
+
+
+def connect(db_path=None, **kwargs):
+    """Open a new configured connection (for callers that need a dedicated one)."""
+    kwargs.setdefault("timeout", BUSY_TIMEOUT_MS / 1000.0)
+    kwargs.setdefault("cached_statements", STATEMENT_CACHE_SIZE)
+    conn = sqlite3.connect(db_path or DB_PATH, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Small LIFO pool of configured connections.
+
+    acquire() never blocks: if every pooled connection is in use a new one is
+    opened, and release() closes it again once POOL_SIZE are idle. A connection
+    returned with an open transaction is rolled back first, so a route that
+    bailed out early cannot leave locks behind for the next borrower.
+    """
+
+    def __init__(self, db_path=None, max_idle=POOL_SIZE):
+        self.db_path = db_path or DB_PATH
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.db_path, check_same_thread=False)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+pool = ConnectionPool()
+
+
+def acquire():
+    return pool.acquire()
+
+
+def release(conn):
+    pool.release(conn)
+
+
+@contextmanager
+def pooled_connection():
+    """with pooled_connection() as conn: ... (returned to the pool afterwards)"""
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+# ---- Adaptive detection scheduling for the live stream ----
+# Instead of detecting on a fixed every-Nth-frame cadence, the stream's
+# detection worker asks the scheduler before each pass:
+#   - motion: every captured frame is reduced to a tiny grayscale thumbnail and
+#     diffed against the previous one. Changed pixels inside known face tracks
+#     are ignored, so only "something moved where we are not looking" counts.
+#   - static scene, nothing tracked: a full scan only every IDLE_INTERVAL frames
+#   - untracked motion: a full scan as soon as the latency budget allows
+#   - faces tracked: region passes every TRACK_INTERVAL frames, or every
+#     MIN_INTERVAL frames while a new face is still being identified, plus a
+#     full scan every FULL_SCAN_INTERVAL frames as a safety net
+#   - latency budget: detection + recognition time is measured per pass kind
+#     (moving average), and passes are spaced so the worker is busy for at
+#     most DETECTION_BUDGET of the frame time, leaving the rest for capture
+#     and encoding
+# All intervals are in frames.
+
+MIN_INTERVAL = 2
+TRACK_INTERVAL = 5
+FULL_SCAN_INTERVAL = 60
+IDLE_INTERVAL = 90
+DETECTION_BUDGET = 0.5       # max fraction of wall time spent detecting
+MOTION_THUMB_SIZE = (80, 60)
+MOTION_PIXEL_DELTA = 15      # gray levels a thumbnail pixel must change by
+MOTION_THRESHOLD = 0.01      # fraction of changed thumbnail pixels that counts as motion
+TRACK_MASK_MARGIN = 0.25     # tracked boxes are grown by this much before masking
+LATENCY_SMOOTHING = 0.2      # weight of the newest sample in the moving average
+RATE_WINDOW_SEC = 10.0
+
+
+class DetectionScheduler:
+    def __init__(self, fps=30):
+        self.frame_period = 1.0 / fps
+        self._lock = threading.Lock()
+        self._prev_thumb = None
+        self._motion = 0.0          # largest untracked motion since the last pass
+        self._latency = {}          # pass kind -> smoothed seconds
+        self._last_pass_seq = None
+        self._last_full_seq = None
+        self._pass_times = deque()
+        self._last_reason = "startup"
+
+    def reset(self):
+        with self._lock:
+            self._prev_thumb = None
+            self._motion = 0.0
+            self._last_pass_seq = None
+            self._last_full_seq = None
+            self._pass_times.clear()
+
+    def observe(self, frame, tracked_boxes=()):
+        """Feed one captured frame; tracked_boxes are (x1, y1, x2, y2) regions to ignore."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumb = cv2.resize(gray, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        prev, self._prev_thumb = self._prev_thumb, thumb
+        if prev is None:
+            return
+        changed = cv2.absdiff(thumb, prev) > MOTION_PIXEL_DELTA
+        if tracked_boxes:
+            sx = MOTION_THUMB_SIZE[0] / frame.shape[1]
+            sy = MOTION_THUMB_SIZE[1] / frame.shape[0]
+            for x1, y1, x2, y2 in tracked_boxes:
+                mx, my = (x2 - x1) * TRACK_MASK_MARGIN, (y2 - y1) * TRACK_MASK_MARGIN
+                changed[max(0, int((y1 - my) * sy)):max(0, math.ceil((y2 + my) * sy)),
+                        max(0, int((x1 - mx) * sx)):max(0, math.ceil((x2 + mx) * sx))] = False
+        motion = float(np.count_nonzero(changed)) / changed.size
+        with self._lock:
+            self._motion = max(self._motion, motion)
+
+    def take_motion(self):
+        """Largest untracked motion since the last pass or call, then reset.
+
+        For callers that process every frame they are given (offline ingestion)
+        and only need to know whether a full scan is due.
+        """
+        with self._lock:
+            motion, self._motion = self._motion, 0.0
+        return motion
+
+    def _latency_floor(self, kind):
+        # caller holds the lock
+        latency = self._latency.get(kind)
+        if latency is None:
+            return MIN_INTERVAL
+        return max(MIN_INTERVAL, math.ceil(latency / (DETECTION_BUDGET * self.frame_period)))
+
+    def decide(self, seq, tracking=False, identifying=False):
+        """'full', 'roi' or None (not yet) for the newest frame seq."""
+        with self._lock:
+            if self._last_pass_seq is None:
+                self._last_reason = "startup"
+                return "full"
+            since_pass = seq - self._last_pass_seq
+            since_full = seq - self._last_full_seq
+            moving = self._motion >= MOTION_THRESHOLD
+
+            if moving and since_pass >= self._latency_floor("full"):
+                self._last_reason = "motion"
+                return "full"
+            if not tracking:
+                if since_full >= max(IDLE_INTERVAL, self._latency_floor("full")):
+                    self._last_reason = "idle"
+                    return "full"
+                return None
+            if since_full >= max(FULL_SCAN_INTERVAL, self._latency_floor("full")):
+                self._last_reason = "periodic"
+                return "full"
+            interval = MIN_INTERVAL if identifying else TRACK_INTERVAL
+            if since_pass >= max(interval, self._latency_floor("roi")):
+                self._last_reason = "identifying" if identifying else "tracking"
+                return "roi"
+            return None
+
+    def started(self, seq, kind):
+        """The worker took frame seq for a pass of this kind."""
+        now = time.monotonic()
+        with self._lock:
+            self._last_pass_seq = seq
+            if kind == "full":
+                self._last_full_seq = seq
+            self._motion = 0.0
+            self._pass_times.append(now)
+            while self._pass_times and now - self._pass_times[0] > RATE_WINDOW_SEC:
+                self._pass_times.popleft()
+
+    def finished(self, kind, seconds):
+        with self._lock:
+            previous = self._latency.get(kind)
+            self._latency[kind] = seconds if previous is None else (
+                (1 - LATENCY_SMOOTHING) * previous + LATENCY_SMOOTHING * seconds)
+
+    def effective_rate(self):
+        """Detection passes per second over the last RATE_WINDOW_SEC."""
+        now = time.monotonic()
+        with self._lock:
+            while self._pass_times and now - self._pass_times[0] > RATE_WINDOW_SEC:
+                self._pass_times.popleft()
+            if not self._pass_times:
+                return 0.0
+            # at least a second of history, so a single fresh pass does not read as a burst
+            span = min(RATE_WINDOW_SEC, max(now - self._pass_times[0], 1.0))
+            return len(self._pass_times) / span
+
+    def stats(self):
+        rate = self.effective_rate()
+        with self._lock:
+            return {
+                "detection_rate_hz": round(rate, 3),
+                "latency_full_ms": round(self._latency["full"] * 1000, 2) if "full" in self._latency else None,
+                "latency_roi_ms": round(self._latency["roi"] * 1000, 2) if "roi" in self._latency else None,
+                "motion": round(self._motion, 4),
+                "last_reason": self._last_reason,
+            }
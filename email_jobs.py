@@ -0,0 +1,284 @@
+import os
+import time
+import uuid
+import smtplib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import db
+
+# ---- Background bulk email jobs ----
+# /send_emails enqueues a job and returns its id; the job runs on its own
+# thread, works out present/absent for every student with one query, and sends
+# through a bounded pool of SMTP connections (one per sender thread) with a
+# shared rate limit and per-message retries. Progress and failures are kept in
+# memory and served by /send_emails/<job_id>.
+#
+# SMTP settings come from the environment; SMTP_USER and SMTP_PASSWORD have no
+# defaults and a job fails straight away without them. SMTP_AUTH=0 skips login,
+# for a local SMTP stand-in (e.g. `python -m aiosmtpd -n -l localhost:8025` with
+# SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 SMTP_AUTH=0).
+#
+# Only per-recipient errors are retried. If the server cannot be reached or
+# rejects the login, the whole job fails at once instead of every message
+# retrying against a server that will never accept it.
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_AUTH = os.environ.get("SMTP_AUTH", "1") not in ("0", "false", "no")
+SMTP_FROM = os.environ.get("SMTP_FROM", SMTP_USER or "attendance@localhost")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "1") not in ("0", "false", "no")
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "30"))
+
+EMAIL_POOL_SIZE = int(os.environ.get("EMAIL_POOL_SIZE", "4"))        # concurrent SMTP connections
+EMAIL_RATE_PER_SEC = float(os.environ.get("EMAIL_RATE_PER_SEC", "5"))  # across the whole job, 0 = unlimited
+EMAIL_MAX_RETRIES = int(os.environ.get("EMAIL_MAX_RETRIES", "3"))
+EMAIL_RETRY_BACKOFF = float(os.environ.get("EMAIL_RETRY_BACKOFF", "1.0"))  # seconds, doubled per retry
+
+MAX_KEPT_JOBS = 50
+
+
+def students_with_status(target_date):
+    """[(student_id, name, email, attendance timestamp or None)] for every student with an email."""
+    with db.pooled_connection() as conn:
+        c = conn.cursor()
+        c.execute("""SELECT s.id, s.name, s.email, a.timestamp
+                     FROM students s
+                     LEFT JOIN attendance a ON a.student_id = s.id AND a.attendance_date = ?
+                     WHERE s.email IS NOT NULL AND s.email != ''
+                     ORDER BY s.id""", (target_date,))
+        return c.fetchall()
+
+
+def build_message(student_name, student_email, target_date, marked_at):
+    if marked_at:
+        # Student was present
+        subject = f"Attendance Alert: PRESENT - {student_name} - {target_date}"
+        body = f"""Dear Parent/Student,
+
+This is to inform you that {student_name} was marked PRESENT on {target_date}.
+
+Attendance Details:
+• Student Name: {student_name}
+• Date: {target_date}
+• Status: PRESENT
+• Marked At: {marked_at}
+
+Thank you for your attention to this matter.
+
+Best regards,
+Digital Attendance System"""
+    else:
+        # Student was absent
+        subject = f"Attendance Alert: ABSENT - {student_name} - {target_date}"
+        body = f"""Dear Parent/Student,
+
+This is to inform you that {student_name} was marked ABSENT on {target_date}.
+
+Attendance Details:
+• Student Name: {student_name}
+• Date: {target_date}
+• Status: ABSENT
+• Note: No attendance record found for this date
+
+Please contact the school administration if you believe this is an error.
+
+Best regards,
+Digital Attendance System"""
+
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_FROM
+    msg['To'] = student_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+class EmailServerError(Exception):
+    """SMTP server unreachable, misconfigured or rejecting the login: fatal for the whole job."""
+
+
+def check_smtp_settings():
+    if SMTP_AUTH and not (SMTP_USER and SMTP_PASSWORD):
+        raise EmailServerError("Email server error: SMTP_USER and SMTP_PASSWORD must be set "
+                               "(or SMTP_AUTH=0 for a server without login)")
+
+
+def open_smtp_connection():
+    try:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    except (smtplib.SMTPException, OSError) as e:
+        raise EmailServerError(f"Email server error: cannot connect to {SMTP_HOST}:{SMTP_PORT}: {e}") from e
+    try:
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_AUTH:
+            server.login(SMTP_USER, SMTP_PASSWORD)
+    except (smtplib.SMTPException, OSError) as e:
+        try:
+            server.close()
+        except Exception:
+            pass
+        raise EmailServerError(f"Email server error: {e}") from e
+    return server
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class EmailJob:
+    def __init__(self, target_date):
+        self.id = uuid.uuid4().hex
+        self.target_date = target_date
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.failures = []
+        self.error = None
+        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, ok, name=None, email=None, error=None):
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.failures.append({"name": name, "email": email, "error": error})
+
+    def to_dict(self):
+        with self._lock:
+            done = self.sent + self.failed
+            return {
+                "job_id": self.id,
+                "date": self.target_date,
+                "status": self.status,
+                "total_students": self.total,
+                "emails_sent": self.sent,
+                "emails_failed": self.failed,
+                "progress": int(done * 100 / self.total) if self.total else (100 if self.finished_at else 0),
+                "failures": list(self.failures),
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class EmailJobManager:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, target_date):
+        job = EmailJob(target_date)
+        with self._lock:
+            self._jobs[job.id] = job
+            # keep memory bounded: drop the oldest finished jobs
+            finished = [j for j in self._jobs.values() if j.finished_at]
+            for old in finished[:max(0, len(self._jobs) - MAX_KEPT_JOBS)]:
+                del self._jobs[old.id]
+        t = threading.Thread(target=self._run, args=(job,), name=f"email-job-{job.id[:8]}", daemon=True)
+        t.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = "running"
+        connections = []
+        local = threading.local()
+        limiter = RateLimiter(EMAIL_RATE_PER_SEC)
+        aborted = threading.Event()
+
+        def connection():
+            if getattr(local, "server", None) is None:
+                local.server = open_smtp_connection()
+                connections.append(local.server)
+            return local.server
+
+        def send_one(row):
+            student_id, name, email, marked_at = row
+            msg = build_message(name, email, job.target_date, marked_at)
+            error = None
+            for attempt in range(EMAIL_MAX_RETRIES + 1):
+                if aborted.is_set():
+                    return
+                if attempt:
+                    time.sleep(EMAIL_RETRY_BACKOFF * (2 ** (attempt - 1)))
+                try:
+                    server = connection()
+                except EmailServerError:
+                    # connect/login failures are not per-message: stop every sender
+                    aborted.set()
+                    raise
+                limiter.wait()
+                try:
+                    server.send_message(msg)
+                    job.record(True)
+                    print(f"Email sent to {name} ({email}) - Status: {'PRESENT' if marked_at else 'ABSENT'}")
+                    return
+                except smtplib.SMTPRecipientsRefused as e:
+                    # permanent for this address; retrying will not help
+                    error = str(e)
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    error = str(e)
+                    if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500:
+                        # permanent rejection (5xx) of this message
+                        break
+                    # drop the connection; the retry opens a fresh one
+                    server, local.server = getattr(local, "server", None), None
+                    if server is not None:
+                        try:
+                            server.close()
+                        except Exception:
+                            pass
+            job.record(False, name, email, error)
+            print(f"Failed to send email to {name} ({email}): {error}")
+
+        try:
+            check_smtp_settings()
+            rows = students_with_status(job.target_date)
+            job.total = len(rows)
+            with ThreadPoolExecutor(max_workers=max(1, min(EMAIL_POOL_SIZE, len(rows) or 1)),
+                                    thread_name_prefix="smtp") as pool:
+                list(pool.map(send_one, rows))
+            job.status = "completed"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"Bulk email job {job.id} error: {e}")
+        finally:
+            for server in connections:
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+            job.finished_at = datetime.datetime.utcnow().isoformat()
+
+
+email_jobs = EmailJobManager()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import numpy as np
+
+# ---- Per-student embedding cache ----
+# Each dataset/<student_id>/ folder keeps a .embeddings.npz next to its images.
+# Entries are keyed by file name and validated by size + mtime, so a retrain
+# only decodes/detects/embeds images that were added or changed, and entries
+# for deleted images are dropped. Images where no face was found are cached
+# too (has_face=False) so they are not re-scanned on every run.
+# Deleting the student folder deletes its cache with it.
+#
+# Each cache file also records the extractor key it was built with (see
+# model.embedding_cache_key: extractor version + detector/crop settings). A
+# cache whose key differs from the current one is discarded as a whole, so
+# embeddings from an older extraction path or other detector settings are
+# never mixed with fresh ones in a training run.
+
+CACHE_FILENAME = ".embeddings.npz"
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def load_cache(folder, key=""):
+    """Return {file name: (size, mtime_ns, embedding or None)} for a student folder.
+
+    Empty if the cache was built with a different extractor key.
+    """
+    path = os.path.join(folder, CACHE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            cached_key = str(data["key"]) if "key" in data.files else ""
+            if cached_key != key:
+                print(f"Discarding embedding cache {path}: built with different extractor settings")
+                return {}
+            names = data["names"]
+            sizes = data["sizes"]
+            mtimes = data["mtimes"]
+            has_face = data["has_face"]
+            embeddings = data["embeddings"]
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Ignoring unreadable embedding cache {path}: {e}")
+        return {}
+    entries = {}
+    for i, name in enumerate(names):
+        emb = embeddings[i] if has_face[i] else None
+        entries[str(name)] = (int(sizes[i]), int(mtimes[i]), emb)
+    return entries
+
+
+def save_cache(folder, entries, key=""):
+    names = sorted(entries)
+    dim = next((len(e[2]) for e in entries.values() if e[2] is not None), 0)
+    embeddings = np.zeros((len(names), dim), dtype=np.float32)
+    has_face = np.zeros(len(names), dtype=bool)
+    for i, name in enumerate(names):
+        emb = entries[name][2]
+        if emb is not None:
+            embeddings[i] = emb
+            has_face[i] = True
+    fd, tmp_path = tempfile.mkstemp(prefix=".embeddings-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f,
+                     key=np.array(key),
+                     names=np.array(names, dtype=str),
+                     sizes=np.array([entries[n][0] for n in names], dtype=np.int64),
+                     mtimes=np.array([entries[n][1] for n in names], dtype=np.int64),
+                     has_face=has_face,
+                     embeddings=embeddings)
+        os.replace(tmp_path, os.path.join(folder, CACHE_FILENAME))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def student_embeddings(folder, files, extract_fn, key=""):
+    """Embeddings for the given image files, using and refreshing the folder's cache.
+
+    extract_fn(path) -> embedding or None is only called for cache misses.
+    key identifies the extractor settings the embeddings come from.
+    Returns (list of embeddings, cache hits, cache misses).
+    """
+    cached = load_cache(folder, key)
+    entries = {}
+    embs = []
+    hits = misses = 0
+    for fn in files:
+        path = os.path.join(folder, fn)
+        try:
+            size, mtime = _file_key(path)
+        except OSError:
+            continue
+        entry = cached.get(fn)
+        if entry is not None and entry[0] == size and entry[1] == mtime:
+            hits += 1
+            emb = entry[2]
+        else:
+            misses += 1
+            emb = extract_fn(path)
+        entries[fn] = (size, mtime, emb)
+        if emb is not None:
+            embs.append(emb)
+    # rewrite only when something was added, changed or deleted
+    if misses or set(cached) != set(entries):
+        try:
+            save_cache(folder, entries, key)
+        except OSError as e:
+            print(f"Could not write embedding cache in {folder}: {e}")
+    return embs, hits, misses
+
+
+def add_to_cache(folder, path_to_embedding, key=""):
+    """Record embeddings computed elsewhere (e.g. at enrollment) in the folder's cache."""
+    entries = load_cache(folder, key)
+    for path, emb in path_to_embedding.items():
+        try:
+            size, mtime = _file_key(path)
+        except OSError:
+            continue
+        entries[os.path.basename(path)] = (size, mtime, emb)
+    save_cache(folder, entries, key)
@@ -0,0 +1,169 @@
+import threading
+import cv2
+
+# ---- Shared face detector ----
+# One place that owns face detection for recognition (/recognize_face),
+# training (train_model_background) and the live stream (video_streaming.py).
+# Detectors are expensive to build (the Haar cascade XML is parsed on load) and
+# are not safe to call from several threads at once, so each thread lazily
+# builds its own instance once and reuses it for the lifetime of the process.
+
+HAAR_CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+# Tunable detection settings. Change them with configure(), not by editing the dict.
+#   backend        "haar" (OpenCV cascade) or "mediapipe" (long-range crowd model)
+#   scale_factor   Haar pyramid step; larger is faster but can miss faces
+#   min_neighbors  Haar candidate votes needed to keep a box
+#   min_size       smallest face (w, h) searched for, in detection-image pixels
+#   max_size       largest face (w, h) searched for, or None for no limit
+#   detect_width   frames wider than this are downscaled before detection and
+#                  the boxes are mapped back to full resolution (0 = never)
+DETECTOR_SETTINGS = {
+    "backend": "haar",
+    "scale_factor": 1.1,
+    "min_neighbors": 4,
+    "min_size": (30, 30),
+    "max_size": None,
+    "detect_width": 640,
+    "mp_model_selection": 1,
+    "mp_min_confidence": 0.5,
+}
+
+_settings_lock = threading.Lock()
+_settings_version = 0
+_thread_local = threading.local()
+
+
+def configure(**settings):
+    """Update detection settings for every thread in the process.
+
+    Unknown keys raise ValueError. Threads pick up the new settings on their
+    next detection call; the backend is rebuilt only if it changed.
+    """
+    global _settings_version
+    unknown = set(settings) - set(DETECTOR_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown detector setting(s): {', '.join(sorted(unknown))}")
+    if "backend" in settings and settings["backend"] not in ("haar", "mediapipe"):
+        raise ValueError("backend must be 'haar' or 'mediapipe'")
+    with _settings_lock:
+        DETECTOR_SETTINGS.update(settings)
+        _settings_version += 1
+
+
+def get_settings():
+    with _settings_lock:
+        return dict(DETECTOR_SETTINGS)
+
+
+class FaceDetector:
+    """Face detector bound to one thread. Use get_detector() rather than building one."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.backend = settings["backend"]
+        self._cascade = None
+        self._mp_detector = None
+        if self.backend == "mediapipe":
+            try:
+                import mediapipe as mp
+                self._mp_detector = mp.solutions.face_detection.FaceDetection(
+                    model_selection=settings["mp_model_selection"],
+                    min_detection_confidence=settings["mp_min_confidence"],
+                )
+            except (ImportError, AttributeError) as e:
+                print(f"MediaPipe face detection unavailable ({e}), falling back to Haar cascade")
+                self.backend = "haar"
+        if self.backend == "haar":
+            self._cascade = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
+            if self._cascade.empty():
+                raise RuntimeError(f"Could not load Haar cascade from {HAAR_CASCADE_PATH}")
+
+    def detect(self, image):
+        """Detect faces in a BGR or grayscale image.
+
+        Returns a list of (x, y, w, h) integer boxes in the coordinates of the
+        image that was passed in, whatever resolution detection ran at.
+        """
+        h, w = image.shape[:2]
+        scale = 1.0
+        detect_width = self.settings["detect_width"]
+        if detect_width and w > detect_width:
+            scale = detect_width / float(w)
+            image = cv2.resize(image, (detect_width, max(1, int(round(h * scale)))),
+                               interpolation=cv2.INTER_AREA)
+
+        if self.backend == "mediapipe":
+            boxes = self._detect_mediapipe(image)
+        else:
+            boxes = self._detect_haar(image)
+
+        faces = []
+        for x, y, bw, bh in boxes:
+            x1 = max(0, int(x / scale))
+            y1 = max(0, int(y / scale))
+            x2 = min(w, int((x + bw) / scale))
+            y2 = min(h, int((y + bh) / scale))
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+
+    def _detect_haar(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        max_size = self.settings["max_size"]
+        return self._cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.settings["scale_factor"],
+            minNeighbors=self.settings["min_neighbors"],
+            minSize=tuple(self.settings["min_size"] or (0, 0)),
+            maxSize=tuple(max_size) if max_size else (0, 0),
+        )
+
+    def _detect_mediapipe(self, image):
+        if image.ndim == 2:
+            rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        else:
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        results = self._mp_detector.process(rgb)
+        h, w = image.shape[:2]
+        boxes = []
+        for detection in results.detections or []:
+            bbox = detection.location_data.relative_bounding_box
+            boxes.append((bbox.xmin * w, bbox.ymin * h, bbox.width * w, bbox.height * h))
+        return boxes
+
+    def close(self):
+        if self._mp_detector is not None:
+            self._mp_detector.close()
+            self._mp_detector = None
+
+
+def get_detector(backend=None):
+    """Return this thread's detector, building it on first use.
+
+    backend overrides the configured backend for this caller only (the video
+    stream asks for "mediapipe" while uploads use the default).
+    """
+    with _settings_lock:
+        settings = dict(DETECTOR_SETTINGS)
+        version = _settings_version
+    if backend:
+        settings["backend"] = backend
+    detectors = getattr(_thread_local, "detectors", None)
+    if detectors is None or _thread_local.version != version:
+        if detectors:
+            for det in detectors.values():
+                det.close()
+        detectors = {}
+        _thread_local.detectors = detectors
+        _thread_local.version = version
+    det = detectors.get(settings["backend"])
+    if det is None:
+        det = FaceDetector(settings)
+        detectors[settings["backend"]] = det
+    return det
+
+
+def detect_faces(image, backend=None):
+    """Convenience wrapper: detect faces with this thread's shared detector."""
+    return get_detector(backend).detect(image)
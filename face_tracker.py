@@ -0,0 +1,169 @@
+import itertools
+from collections import Counter, deque
+
+# ---- Lightweight face tracking for the live stream ----
+# Tracks carry a face's box and identity from one detection pass to the next,
+# so the stream does not have to re-detect the whole frame or re-recognize
+# every face on every pass:
+#   - detections are matched to tracks greedily by IoU against each track's
+#     predicted box, with a centroid-distance fallback for fast movers
+#   - each track collects recognition votes; the identity is only accepted
+#     once one label has VOTES_REQUIRED votes and at least VOTE_MIN_SHARE of
+#     the recent votes, and only then is attendance marked (callers sampling
+#     fewer frames, like offline ingestion with a stride, pass a lower count)
+#   - once decided, a track is re-recognized only every REVERIFY_INTERVAL
+#     frames
+# Boxes are (x, y, w, h) in frame pixels; "seq" is a frame number, and velocity
+# is in pixels per frame.
+
+IOU_MATCH_THRESHOLD = 0.3
+CENTROID_MATCH_RATIO = 0.5   # max centre distance, as a fraction of the track's size
+MAX_MISSES = 3               # detection passes a track may go unseen before it is dropped
+ROI_MARGIN = 0.5             # search region grows by this fraction of the box on each side
+VOTES_REQUIRED = 3
+VOTE_WINDOW = 5
+VOTE_MIN_SHARE = 0.6
+REVERIFY_INTERVAL = 90       # frames between re-recognitions of a decided track
+MAX_EXTRAPOLATION = 15       # frames a box may be moved along its velocity when drawn
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centre(box):
+    x, y, w, h = box
+    return x + w / 2.0, y + h / 2.0
+
+
+class Track:
+    _ids = itertools.count(1)
+
+    def __init__(self, box, seq, votes_required=VOTES_REQUIRED):
+        self.id = next(Track._ids)
+        self.box = tuple(int(v) for v in box)
+        self.seq = seq
+        self.velocity = (0.0, 0.0)
+        self.misses = 0
+        self.votes = deque(maxlen=VOTE_WINDOW)  # (label or None, confidence)
+        self.votes_required = votes_required
+        self.identity = None
+        self.confidence = 0.0
+        self.decided = False
+        self.last_recognized_seq = None
+        self.marked_id = None  # student attendance was marked for
+
+    def predicted_box(self, seq):
+        steps = min(max(seq - self.seq, 0), MAX_EXTRAPOLATION)
+        x, y, w, h = self.box
+        return (int(x + self.velocity[0] * steps), int(y + self.velocity[1] * steps), w, h)
+
+    def update(self, box, seq):
+        box = tuple(int(v) for v in box)
+        if seq > self.seq:
+            (cx, cy), (px, py) = _centre(box), _centre(self.box)
+            steps = seq - self.seq
+            # smooth the velocity so one jittery detection does not fling the box
+            self.velocity = (0.5 * self.velocity[0] + 0.5 * (cx - px) / steps,
+                             0.5 * self.velocity[1] + 0.5 * (cy - py) / steps)
+        self.box = box
+        self.seq = seq
+        self.misses = 0
+
+    def needs_recognition(self, seq):
+        if not self.decided or self.last_recognized_seq is None:
+            return True
+        return seq - self.last_recognized_seq >= REVERIFY_INTERVAL
+
+    def add_vote(self, label, confidence, seq):
+        """Record one recognition result and re-evaluate the track's identity."""
+        self.last_recognized_seq = seq
+        self.votes.append((label, float(confidence)))
+        counts = Counter(v[0] for v in self.votes)
+        label, count = counts.most_common(1)[0]
+        if count >= self.votes_required and count / len(self.votes) >= VOTE_MIN_SHARE:
+            self.decided = True
+            self.identity = label
+            self.confidence = sum(c for l, c in self.votes if l == label) / count
+        elif self.decided and counts.get(self.identity, 0) < self.votes_required:
+            # recent re-verifications disagree; collect votes again
+            self.decided = False
+            self.identity = None
+
+    def search_region(self, frame_shape, seq):
+        """Box around the predicted position to run detection in, clipped to the frame."""
+        x, y, w, h = self.predicted_box(seq)
+        mx, my = int(w * ROI_MARGIN), int(h * ROI_MARGIN)
+        fh, fw = frame_shape[:2]
+        x1, y1 = max(0, x - mx), max(0, y - my)
+        x2, y2 = min(fw, x + w + mx), min(fh, y + h + my)
+        return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
+
+
+class FaceTracker:
+    def __init__(self, votes_required=VOTES_REQUIRED):
+        self.votes_required = votes_required
+        self.tracks = []
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def update(self, boxes, seq):
+        """Match detected boxes to tracks. Returns the tracks seen in this pass."""
+        boxes = [tuple(int(v) for v in b) for b in boxes]
+        predicted = [t.predicted_box(seq) for t in self.tracks]
+
+        pairs = []
+        for ti, pbox in enumerate(predicted):
+            for bi, box in enumerate(boxes):
+                overlap = iou(pbox, box)
+                if overlap >= IOU_MATCH_THRESHOLD:
+                    pairs.append((overlap, ti, bi))
+        pairs.sort(reverse=True)
+
+        matched_tracks, matched_boxes = {}, set()
+        for _, ti, bi in pairs:
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks[ti] = bi
+            matched_boxes.add(bi)
+
+        # centroid fallback for faces that moved too far to overlap
+        for ti, pbox in enumerate(predicted):
+            if ti in matched_tracks:
+                continue
+            pcx, pcy = _centre(pbox)
+            limit = CENTROID_MATCH_RATIO * max(pbox[2], pbox[3])
+            best = None
+            for bi, box in enumerate(boxes):
+                if bi in matched_boxes:
+                    continue
+                cx, cy = _centre(box)
+                dist = ((cx - pcx) ** 2 + (cy - pcy) ** 2) ** 0.5
+                if dist <= limit and (best is None or dist < best[0]):
+                    best = (dist, bi)
+            if best is not None:
+                matched_tracks[ti] = best[1]
+                matched_boxes.add(best[1])
+
+        seen = []
+        for ti, track in enumerate(self.tracks):
+            if ti in matched_tracks:
+                track.update(boxes[matched_tracks[ti]], seq)
+                seen.append(track)
+            else:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= MAX_MISSES]
+
+        for bi, box in enumerate(boxes):
+            if bi not in matched_boxes:
+                track = Track(box, seq, self.votes_required)
+                self.tracks.append(track)
+                seen.append(track)
+        return seen
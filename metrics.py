@@ -0,0 +1,234 @@
+import math
+import threading
+
+# ---- In-process metrics, served as Prometheus text by GET /metrics ----
+# A deliberately small stand-in for prometheus_client (no extra dependency):
+# counters, gauges and histograms with labels, plus "collectors" - callbacks
+# that report values owned by other objects (e.g. the video broadcaster) at
+# scrape time instead of pushing them on every frame. Metric objects are
+# defined here so every module records into the same names.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; fine at the low end for per-stage timings, up to training-length runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                                for k, v in items]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]  # bucket counts, count, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[1] if state else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = self.header()
+        for key, (counts, total, value_sum) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_value(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(value_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """fn() -> [(name, type, help, [(labels dict, value), ...]), ...], called on every scrape."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for fn in collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+                continue
+            for name, type_name, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    labels = sorted(labels.items())
+                    lines.append(f"{name}{_format_labels((), (), labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# /recognize_face
+RECOGNIZE_STAGE_SECONDS = registry.histogram(
+    "recognize_face_stage_seconds",
+    "Time spent in each /recognize_face stage (cache_lookup, decode, detect, embed, predict, name_lookup, "
+    "mark_attendance).",
+    ["stage"])
+RECOGNIZE_REQUEST_SECONDS = registry.histogram(
+    "recognize_face_request_seconds", "Total /recognize_face handling time.")
+RECOGNIZE_RESULTS = registry.counter(
+    "recognize_face_results_total",
+    "/recognize_face outcomes: recognized, unrecognized (faces but no match), no_face, error.",
+    ["result"])
+RECOGNIZE_CACHE = registry.counter(
+    "recognize_face_cache_total",
+    "/recognize_face frames answered from the per-client result cache (hit) or fully recognized (miss).",
+    ["result"])
+
+# attendance writes (every caller: HTTP, stream, offline ingestion)
+ATTENDANCE_MARKS = registry.counter(
+    "attendance_marks_total", "mark_attendance calls by outcome: new, duplicate or error.", ["outcome"])
+
+# training
+TRAINING_RUNS = registry.counter("training_runs_total", "Training runs by final status.", ["status"])
+TRAINING_PHASE_SECONDS = registry.histogram(
+    "training_phase_seconds", "Training time per phase (extract = feature extraction, evaluate = held-out "
+    "evaluation of classifier backends, fit = classifier fit, total = whole run).", ["phase"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+TRAINING_IMAGES = registry.counter("training_images_processed_total", "Face images used by training runs.")
+TRAINING_CACHE = registry.counter(
+    "training_embedding_cache_total", "Training images served from the embedding cache (hit) or extracted (miss).",
+    ["result"])
+TRAINING_LAST_DURATION = registry.gauge("training_last_duration_seconds", "Duration of the last training run.")
+TRAINING_LAST_IMAGES = registry.gauge("training_last_images", "Face images used by the last training run.")
+CLASSIFIER_ACCURACY = registry.gauge(
+    "classifier_heldout_accuracy", "Held-out accuracy of each classifier backend in the last training run.",
+    ["backend"])
+CLASSIFIER_PREDICT_SECONDS = registry.gauge(
+    "classifier_predict_seconds", "Predict latency per face of each backend in the last training run "
+    "(mode = single or batch).", ["backend", "mode"])
+CLASSIFIER_SELECTED = registry.gauge(
+    "classifier_selected", "1 for the backend serving model.pkl, 0 for the other evaluated ones.", ["backend"])
+
+
+def render():
+    return registry.render()
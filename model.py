@@ -1,10 +1,35 @@
 import os
 import cv2
+import json
+import hashlib
 import numpy as np
 import pickle
-from sklearn.ensemble import RandomForestClassifier
+import tempfile
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from face_detector import detect_faces, configure as configure_detector, get_settings as get_detector_settings
+from embedding_cache import student_embeddings, add_to_cache
+from classifier_backends import (CLASSIFIER_BACKEND, CLASSIFIER_ACCURACY_FLOOR, evaluation_candidates,
+                                 evaluate_backends, select_backend, fit_classifier, format_evaluation,
+                                 backend_accuracy)
+from metrics import (TRAINING_RUNS, TRAINING_PHASE_SECONDS, TRAINING_IMAGES, TRAINING_CACHE,
+                     TRAINING_LAST_DURATION, TRAINING_LAST_IMAGES,
+                     CLASSIFIER_ACCURACY, CLASSIFIER_PREDICT_SECONDS, CLASSIFIER_SELECTED)
 
 MODEL_PATH = "model.pkl"
+# held-out accuracy / latency of every evaluated backend from the last training run
+MODEL_REPORT_PATH = "model_report.json"
+
+# Processes used for feature extraction during training (one student folder per task)
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", os.cpu_count() or 1))
+
+# Side of the square grayscale crop a face embedding is made from
+EMBED_SIZE = 32
+# Bump whenever decode/detect/crop/embed changes what an image's embedding is;
+# cached embeddings from another version are discarded (embedding_cache.py)
+EMBEDDING_EXTRACTOR_VERSION = 2  # 2: reduced-resolution grayscale decode
 
 # ---- Utility: extract face crop -> small grayscale vector (embedding) ----
 # Note: This function is kept for backward compatibility but is no longer used
@@ -31,43 +56,226 @@ def crop_face_and_embed(bgr_image, detection):
     emb = face.flatten().astype(np.float32) / 255.0
     return emb
 
-def extract_embedding_for_image(stream_or_bytes):
-    # accepts a file-like stream (werkzeug FileStorage.stream)
-    # Using OpenCV's DNN face detector as fallback since MediaPipe API changed
-    import cv2
-    
-    # Read image from stream
-    data = stream_or_bytes.read()
+def embed_face(image, box):
+    # BGR or grayscale image + (x, y, w, h) box -> 32x32 grayscale vector
+    x, y, w, h = box
+    face = image[y:y+h, x:x+w]
+    if face.size == 0:
+        return None
+    if face.ndim == 3:
+        face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    face = cv2.resize(face, (EMBED_SIZE, EMBED_SIZE), interpolation=cv2.INTER_AREA)
+    emb = face.flatten().astype(np.float32) / 255.0
+    return emb
+
+# ---- Reduced-resolution decode ----
+# Recognition only needs a 32x32 crop, so images are decoded straight to
+# grayscale at a reduced size (libjpeg scales while decoding with the
+# IMREAD_REDUCED_GRAYSCALE_* modes) and detection runs on that. The largest
+# 1/2, 1/4 or 1/8 reduction that keeps the image at least RECOGNITION_WORK_WIDTH
+# wide is used; 0 decodes at full resolution. Boxes are reported in full-
+# resolution coordinates, and a face too small in the reduced image for a clean
+# crop is re-cropped from a full-resolution decode.
+# With the default 640, only uploads 1280+ px wide are reduced; 640x480 kiosk
+# frames get the grayscale decode only. 320 halves those too (~3x faster per
+# frame) but the Haar detector then misses faces under ~120 px, so it is an
+# opt-in for kiosks where faces fill the frame.
+RECOGNITION_WORK_WIDTH = int(os.environ.get("RECOGNITION_WORK_WIDTH", "640"))
+_REDUCED_MODES = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                  (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def image_dimensions(data):
+    # (width, height) from a JPEG or PNG header without decoding, or None
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:  # markers without a length
+            i += 2
+            continue
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+def reduction_factor(data, work_width=None):
+    work_width = RECOGNITION_WORK_WIDTH if work_width is None else work_width
+    dims = image_dimensions(data) if work_width else None
+    if dims is None:
+        return 1
+    for factor, _ in _REDUCED_MODES:
+        if dims[0] // factor >= work_width:
+            return factor
+    return 1
+
+def decode_grayscale(data, factor=1):
+    # encoded bytes -> grayscale image decoded at 1/factor size, or None
     arr = np.frombuffer(data, np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if img is None:
+    mode = dict(_REDUCED_MODES).get(factor, cv2.IMREAD_GRAYSCALE)
+    return cv2.imdecode(arr, mode)
+
+def _embed_faces(data, gray, factor, faces):
+    # [(full-resolution box, embedding), ...]; faces found in the reduced image
+    # that are too small there for a clean EMBED_SIZE crop are cropped from a
+    # full-resolution decode instead (done at most once per image)
+    full = None
+    results = []
+    for box in faces:
+        x, y, w, h = (int(v) for v in box)
+        full_box = (x * factor, y * factor, w * factor, h * factor)
+        if factor == 1 or min(w, h) >= EMBED_SIZE:
+            emb = embed_face(gray, (x, y, w, h))
+        else:
+            if full is None:
+                full = decode_grayscale(data)
+            emb = embed_face(full, full_box) if full is not None else embed_face(gray, (x, y, w, h))
+        if emb is not None:
+            results.append((full_box, emb))
+    return results
+
+def extract_embeddings_for_image(stream_or_bytes, timings=None):
+    # every detected face: returns [(box, embedding), ...] (empty if no face),
+    # or None if the image could not be decoded
+    # timings (optional dict) gets seconds spent in "decode", "detect" and "embed"
+    started = time.perf_counter()
+    # Read image from stream and decode at the working resolution
+    data = stream_or_bytes.read()
+    factor = reduction_factor(data)
+    gray = decode_grayscale(data, factor)
+    if gray is None:
         return None
+    decoded = time.perf_counter()
     
-    # Use OpenCV's Haar Cascade or DNN for face detection
-    # Load face detector
-    face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-    face_cascade = cv2.CascadeClassifier(face_cascade_path)
+    # Detect with the shared per-thread detector (see face_detector.py)
+    faces = detect_faces(gray)
+    detected = time.perf_counter()
     
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    
-    if len(faces) == 0:
+    results = _embed_faces(data, gray, factor, faces)
+    if timings is not None:
+        timings["decode"] = timings.get("decode", 0.0) + decoded - started
+        timings["detect"] = timings.get("detect", 0.0) + detected - decoded
+        timings["embed"] = timings.get("embed", 0.0) + time.perf_counter() - detected
+    return results
+
+def embed_faces_at(data, boxes):
+    # embeddings at known full-resolution boxes, skipping detection; identical to
+    # what extract_embeddings_for_image computes for the same image and boxes
+    factor = reduction_factor(data)
+    gray = decode_grayscale(data, factor)
+    if gray is None:
+        return None
+    reduced = [tuple(int(v) // factor for v in box) for box in boxes]
+    results = _embed_faces(data, gray, factor, reduced)
+    if len(results) != len(boxes):
+        return None
+    return [emb for _, emb in results]
+
+def extract_embedding_for_image(stream_or_bytes):
+    # accepts a file-like stream (werkzeug FileStorage.stream)
+    faces = extract_embeddings_for_image(stream_or_bytes)
+    if not faces:
         return None
-    
     # Use the first detected face
-    x, y, w, h = faces[0]
-    face = img[y:y+h, x:x+w]
-    face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-    face = cv2.resize(face, (32,32), interpolation=cv2.INTER_AREA)
-    emb = face.flatten().astype(np.float32) / 255.0
-    return emb
+    return faces[0][1]
+
+def extract_embedding_for_file(path):
+    # training / enrollment: same reduced-resolution path as uploads
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    factor = reduction_factor(data)
+    gray = decode_grayscale(data, factor)
+    if gray is None:
+        return None
+    faces = detect_faces(gray)
+    if len(faces) == 0:
+        return None
+    results = _embed_faces(data, gray, factor, faces[:1])
+    return results[0][1] if results else None
+
+def embedding_cache_key():
+    # identifies everything that shapes an embedding: extractor version, crop
+    # size, decode working width and the current detector settings
+    settings = {"version": EMBEDDING_EXTRACTOR_VERSION, "embed_size": EMBED_SIZE,
+                "work_width": RECOGNITION_WORK_WIDTH, "detector": get_detector_settings()}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
 
 # ---- Load model helpers ----
+class ModelRegistry:
+    """Process-wide holder for the trained classifier.
+
+    The model is unpickled once and kept in memory. Each get() costs one
+    os.stat(): if the file's mtime/size/inode changed (another process
+    retrained) the new file is loaded, otherwise the cached model is returned.
+    Model and version are swapped together as one tuple, so readers never see
+    a half-updated state.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = (None, None)  # (file version, model)
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self):
+        version = self._file_version()
+        if version is None:
+            return None
+        cached_version, model = self._state
+        if version == cached_version:
+            return model
+        with self._lock:
+            cached_version, model = self._state
+            if version != cached_version:
+                with open(self.path, "rb") as f:
+                    model = pickle.load(f)
+                self._state = (version, model)
+        return model
+
+    def swap(self, model):
+        """Persist model atomically and make it the one served from now on."""
+        with self._lock:
+            save_model_atomic(model, self.path)
+            self._state = (self._file_version(), model)
+
+def save_model_atomic(model, path):
+    # write to a temp file in the same directory, then rename over the old
+    # model so readers see either the old file or the new one, never a partial one
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".model-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(model, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+model_registry = ModelRegistry(MODEL_PATH)
+
 def load_model_if_exists():
-    if not os.path.exists(MODEL_PATH):
-        return None
-    with open(MODEL_PATH, "rb") as f:
-        return pickle.load(f)
+    # cached; reloads only when model.pkl changes on disk
+    return model_registry.get()
 
 def predict_with_model(clf, emb):
     # returns label and confidence (max probability)
@@ -77,24 +285,367 @@ def predict_with_model(clf, emb):
     conf = float(proba[idx])
     return label, conf
 
+def predict_many_with_model(clf, embs):
+    # one predict_proba call for a stacked (n_faces, dim) matrix -> [(label, conf), ...]
+    if len(embs) == 0:
+        return []
+    proba = clf.predict_proba(np.asarray(embs, dtype=np.float32))
+    idx = np.argmax(proba, axis=1)
+    return [(clf.classes_[i], float(p[i])) for i, p in zip(idx, proba)]
+
+# ---- Embedding gallery (nearest-neighbour backend) ----
+# Alternative to the RandomForest: every enrolled embedding lives in one
+# contiguous float32 matrix, a query is matched with a single matrix-vector
+# product, and anything farther than the distance threshold is "unknown".
+# Enrolling or deleting a student updates the matrix in place; no retrain.
+GALLERY_PATH = "gallery.npz"
+GALLERY_DISTANCE_THRESHOLD = 0.25  # cosine distance (1 - similarity)
+
+def _normalize_embeddings(E):
+    # zero-mean, unit-length rows: cosine similarity becomes a dot product and
+    # global brightness changes between captures cancel out
+    E = np.asarray(E, dtype=np.float32)
+    if E.ndim == 1:
+        E = E[None, :]
+    E = E - E.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(E, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return E / norms
+
+class EmbeddingGallery:
+    """Labelled matrix of normalised face embeddings with cosine matching.
+
+    Rows are kept in a pre-allocated buffer that grows geometrically, so adds
+    are amortised O(rows added). Readers take a (matrix, labels) snapshot
+    without locking; writers hold the lock and publish a new snapshot.
+
+    Like ModelRegistry, every match costs one os.stat() of the gallery file and
+    reloads it when another process saved a newer one. Each row remembers the
+    generation it was added in, so a training run can rebuild the gallery
+    without losing students enrolled (or deleting students removed) while it
+    was extracting: see replace_all(since=...).
+    """
+
+    def __init__(self, path=GALLERY_PATH, threshold=GALLERY_DISTANCE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._buf = None
+        self._label_buf = np.empty(0, dtype=np.int64)
+        self._gen_buf = np.empty(0, dtype=np.int64)  # generation each row was added in
+        self._snapshot = (np.empty((0, 0), dtype=np.float32), self._label_buf)
+        self._generation = 0  # bumped by every add/remove
+        self._removed = {}  # label -> generation it was removed in
+        self._file_version = None  # (mtime_ns, size, inode) of the file last loaded or saved
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def labels(self):
+        return np.unique(self._snapshot[1])
+
+    def generation(self):
+        """Marker for replace_all(since=...): changes made after this call are kept."""
+        return self._generation
+
+    def _publish(self, n):
+        self._snapshot = (self._buf[:n], self._label_buf[:n])
+
+    def _set_rows(self, E, labels, gens):
+        # caller holds self._lock
+        self._label_buf = np.asarray(labels, dtype=np.int64).copy()
+        self._gen_buf = np.asarray(gens, dtype=np.int64).copy()
+        if len(self._label_buf):
+            self._buf = np.ascontiguousarray(E, dtype=np.float32)
+            self._publish(len(self._label_buf))
+        else:
+            self._buf = None
+            self._snapshot = (np.empty((0, 0), dtype=np.float32), self._label_buf)
+
+    def add(self, label, embeddings):
+        E = _normalize_embeddings(embeddings)
+        if len(E) == 0:
+            return 0
+        self.refresh()
+        with self._lock:
+            n = len(self._snapshot[1])
+            if self._buf is None:
+                self._buf = np.empty((max(64, len(E)), E.shape[1]), dtype=np.float32)
+                self._label_buf = np.empty(len(self._buf), dtype=np.int64)
+                self._gen_buf = np.empty(len(self._buf), dtype=np.int64)
+                n = 0
+            elif self._buf.shape[1] != E.shape[1]:
+                raise ValueError(f"Embedding size {E.shape[1]} does not match the gallery's "
+                                 f"{self._buf.shape[1]}; retrain to rebuild the gallery")
+            if n + len(E) > len(self._buf):
+                capacity = max(2 * len(self._buf), n + len(E))
+                buf = np.empty((capacity, E.shape[1]), dtype=np.float32)
+                buf[:n] = self._buf[:n]
+                label_buf = np.empty(capacity, dtype=np.int64)
+                label_buf[:n] = self._label_buf[:n]
+                gen_buf = np.empty(capacity, dtype=np.int64)
+                gen_buf[:n] = self._gen_buf[:n]
+                self._buf, self._label_buf, self._gen_buf = buf, label_buf, gen_buf
+            self._generation += 1
+            # rows past n are invisible to readers until _publish
+            self._buf[n:n + len(E)] = E
+            self._label_buf[n:n + len(E)] = int(label)
+            self._gen_buf[n:n + len(E)] = self._generation
+            self._publish(n + len(E))
+        return len(E)
+
+    def remove(self, label):
+        self.refresh()
+        with self._lock:
+            E, labels = self._snapshot
+            keep = labels != int(label)
+            removed = int(len(labels) - keep.sum())
+            self._generation += 1
+            self._removed[int(label)] = self._generation
+            if removed:
+                # compact into fresh buffers so existing snapshots stay valid
+                self._set_rows(E[keep], labels[keep], self._gen_buf[:len(labels)][keep])
+        return removed
+
+    def replace_all(self, X, y, since=None):
+        """Rebuild from training data (X, y).
+
+        since: generation() taken before the training data was read. Rows added
+        after it are kept and students removed after it are dropped, so
+        enrolments and deletions made during training survive the rebuild.
+        """
+        E = _normalize_embeddings(X) if len(X) else np.empty((0, 0), dtype=np.float32)
+        y = np.asarray(y, dtype=np.int64)
+        with self._lock:
+            gens = np.zeros(len(y), dtype=np.int64)
+            if since is not None:
+                removed = [label for label, gen in self._removed.items() if gen > since]
+                if removed and len(y):
+                    keep = ~np.isin(y, removed)
+                    E, y, gens = E[keep], y[keep], gens[keep]
+                old_E, old_labels = self._snapshot
+                recent = self._gen_buf[:len(old_labels)] > since
+                if recent.any():
+                    E = np.vstack([E, old_E[recent]]) if len(y) else old_E[recent]
+                    y = np.concatenate([y, old_labels[recent]])
+                    gens = np.concatenate([gens, self._gen_buf[:len(old_labels)][recent]])
+            self._removed = {label: gen for label, gen in self._removed.items()
+                             if since is not None and gen > since}
+            self._set_rows(E, y, gens)
+
+    def match_many(self, embeddings):
+        """Match a batch of embeddings; returns [(label or None, distance), ...]."""
+        self.refresh()
+        E, labels = self._snapshot
+        Q = _normalize_embeddings(embeddings)
+        if len(labels) == 0:
+            return [(None, 1.0)] * len(Q)
+        sims = Q @ E.T
+        best = np.argmax(sims, axis=1)
+        dists = 1.0 - sims[np.arange(len(Q)), best]
+        results = []
+        for idx, dist in zip(best, dists):
+            dist = float(dist)
+            label = int(labels[idx]) if dist <= self.threshold else None
+            results.append((label, dist))
+        return results
+
+    def match(self, emb):
+        return self.match_many([emb])[0]
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def refresh(self):
+        """Reload the gallery file if another process saved a newer one."""
+        version = self._stat_file()
+        if version is not None and version != self._file_version:
+            self.load()
+
+    def save(self):
+        E, labels = self._snapshot
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".gallery-", suffix=".npz", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, embeddings=E, labels=labels)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._file_version = self._stat_file()
+
+    def load(self):
+        version = self._stat_file()
+        if version is None:
+            return False
+        with np.load(self.path) as data:
+            E, labels = data["embeddings"], data["labels"].astype(np.int64)
+        with self._lock:
+            gens = np.zeros(len(labels), dtype=np.int64)
+            if self._file_version is not None:
+                # students another process enrolled since our last load count
+                # as added now, so a training run in this process keeps them
+                fresh = ~np.isin(labels, self._snapshot[1])
+                if fresh.any():
+                    self._generation += 1
+                    gens[fresh] = self._generation
+            self._set_rows(E, labels, gens)
+            self._file_version = version
+        return True
+
+gallery = EmbeddingGallery()
+gallery.load()
+
+def predict_with_gallery(emb):
+    # same (label, confidence) shape as predict_with_model; label is None when
+    # the nearest enrolled face is beyond GALLERY_DISTANCE_THRESHOLD
+    label, dist = gallery.match(emb)
+    return label, 1.0 - dist
+
+def predict_many_with_gallery(embs):
+    return [(label, 1.0 - dist) for label, dist in gallery.match_many(embs)] if len(embs) else []
+
+# ---- Backend selection shared by the HTTP routes and the video stream ----
+# "forest" (the classifier in model.pkl, needs /train_model; see
+# classifier_backends.py for which one) or "gallery" (nearest-neighbour over
+# enrolled embeddings, updated on upload/delete without retraining)
+RECOGNITION_BACKEND = os.environ.get("RECOGNITION_BACKEND", "forest")
+FOREST_CONFIDENCE_THRESHOLD = 0.5
+
+def recognize_embeddings(embs):
+    """
+    Classify a stack of embeddings with the configured backend in one call.
+    Returns (error message or None, [(label or None, confidence), ...]); the
+    label is None for faces below the backend's acceptance threshold.
+    """
+    if len(embs) == 0:
+        return None, []
+    if RECOGNITION_BACKEND == "gallery":
+        if len(gallery) == 0:
+            return "no students enrolled", None
+        # gallery already applied its distance threshold (label None = stranger)
+        return None, predict_many_with_gallery(np.stack(embs))
+    clf = load_model_if_exists()
+    if clf is None:
+        return "model not trained", None
+    return None, [(label, conf) if conf >= FOREST_CONFIDENCE_THRESHOLD else (None, conf)
+                  for label, conf in predict_many_with_model(clf, np.stack(embs))]
+
+def enroll_student_images(student_id, paths):
+    """Embed freshly uploaded images and add them to the gallery. Returns count added.
+
+    The embeddings are also written to the student's embedding cache so the
+    next training run does not extract them again.
+    """
+    computed = {p: extract_embedding_for_file(p) for p in paths}
+    if computed:
+        add_to_cache(os.path.dirname(paths[0]), computed, embedding_cache_key())
+    embs = [e for e in computed.values() if e is not None]
+    if not embs:
+        return 0
+    added = gallery.add(student_id, np.stack(embs))
+    gallery.save()
+    return added
+
+def remove_student_from_gallery(student_id):
+    removed = gallery.remove(student_id)
+    if removed:
+        gallery.save()
+    return removed
+
+# ---- Parallel feature extraction (one task per student folder) ----
+# Workers are spawned, not forked: training runs inside the multi-threaded
+# server (request, camera and attendance-writer threads), and a forked child
+# can inherit a lock some other thread was holding. A spawned worker starts
+# from a fresh interpreter, so the parent's detector settings and embedding
+# cache key are handed over explicitly.
+_worker_cache_key = None
+
+def _init_extract_worker(detector_settings=None, cache_key=None):
+    global _worker_cache_key
+    # each worker is single-threaded inside OpenCV; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    if detector_settings:
+        configure_detector(**detector_settings)
+    _worker_cache_key = cache_key
+
+def _extract_student_dir(dataset_dir, sid, cache_key=None):
+    """Returns (sid, number of image files or None if the folder is gone, embeddings, cache hits, misses)."""
+    folder = os.path.join(dataset_dir, sid)
+    if not os.path.exists(folder):
+        return sid, None, [], 0, 0
+    files = [f for f in os.listdir(folder) if f.lower().endswith((".jpg",".jpeg",".png"))]
+    if len(files) == 0:
+        return sid, 0, [], 0, 0
+    # cached embeddings for unchanged images; only new/changed files are processed
+    key = cache_key or _worker_cache_key or embedding_cache_key()
+    embs, hits, misses = student_embeddings(folder, files, extract_embedding_for_file, key)
+    return sid, len(files), embs, hits, misses
+
+def _iter_student_extractions(dataset_dir, student_dirs, workers):
+    # yields per-student results as they finish
+    cache_key = embedding_cache_key()
+    if workers <= 1 or len(student_dirs) <= 1:
+        for sid in student_dirs:
+            yield _extract_student_dir(dataset_dir, sid, cache_key)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(student_dirs)),
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_extract_worker,
+                             initargs=(get_detector_settings(), cache_key)) as pool:
+        futures = [pool.submit(_extract_student_dir, dataset_dir, sid) for sid in student_dirs]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+def _record_classifier_report(backend, evaluation, n_samples):
+    # metrics + model_report.json next to model.pkl; the report is informational,
+    # so failing to write it never fails the training run
+    CLASSIFIER_SELECTED.set(1, backend=backend)
+    for entry in (evaluation or {}).get("backends", []):
+        if entry["backend"] != backend:
+            CLASSIFIER_SELECTED.set(0, backend=entry["backend"])
+        if "error" in entry:
+            continue
+        if entry["accuracy"] is not None:
+            CLASSIFIER_ACCURACY.set(entry["accuracy"], backend=entry["backend"])
+        CLASSIFIER_PREDICT_SECONDS.set(entry["predict_ms"] / 1000, backend=entry["backend"], mode="single")
+        CLASSIFIER_PREDICT_SECONDS.set(entry["batch_predict_ms_per_face"] / 1000, backend=entry["backend"],
+                                       mode="batch")
+    report = {"selected": backend, "requested": CLASSIFIER_BACKEND, "accuracy_floor": CLASSIFIER_ACCURACY_FLOOR,
+              "samples": n_samples, "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "evaluation": evaluation}
+    try:
+        tmp_path = MODEL_REPORT_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, MODEL_REPORT_PATH)
+    except OSError as e:
+        print(f"Could not write {MODEL_REPORT_PATH}: {e}")
+
 # ---- Training function used in background ----
-def train_model_background(dataset_dir, progress_callback=None):
+def train_model_background(dataset_dir, progress_callback=None, workers=None):
     """
     dataset_dir/
         student_id/
             img1.jpg
             img2.jpg
     progress_callback(progress_percent, message) -> optional
+    workers -> extraction processes (default TRAINING_WORKERS, 1 = no pool)
     """
+    started = time.perf_counter()
+    # students enrolled or deleted from here on are merged into the rebuilt gallery
+    gallery_since = gallery.generation()
     try:
-        # Using OpenCV's Haar Cascade for face detection (more compatible)
-        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        face_cascade = cv2.CascadeClassifier(face_cascade_path)
-
         X = []
         y = []
         
         if not os.path.exists(dataset_dir):
+            TRAINING_RUNS.inc(status="no_data")
             if progress_callback:
                 progress_callback(0, "Dataset directory not found")
             return
@@ -102,63 +653,55 @@ def train_model_background(dataset_dir, progress_callback=None):
         student_dirs = [d for d in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, d))]
         
         if len(student_dirs) == 0:
+            TRAINING_RUNS.inc(status="no_data")
             if progress_callback:
                 progress_callback(0, "No students found. Add students first.")
             return
         
         total_students = len(student_dirs)
         processed = 0
+        n_images = 0
+        cache_hits = 0
+        cache_misses = 0
+        workers = TRAINING_WORKERS if workers is None else workers
 
         if progress_callback:
-            progress_callback(5, f"Found {total_students} student(s). Processing images...")
+            progress_callback(5, f"Found {total_students} student(s). Processing images with {max(1, workers)} worker(s)...")
 
-        for sid in student_dirs:
-            folder = os.path.join(dataset_dir, sid)
-            if not os.path.exists(folder):
-                processed += 1
+        per_student = {}
+        for sid, n_files, embs, hits, misses in _iter_student_extractions(dataset_dir, student_dirs, workers):
+            processed += 1
+            if n_files is None:
                 continue
-                
-            files = [f for f in os.listdir(folder) if f.lower().endswith((".jpg",".jpeg",".png"))]
-            
-            if len(files) == 0:
-                processed += 1
+            if n_files == 0:
                 if progress_callback:
                     pct = int((processed/total_students)*80)
                     progress_callback(pct, f"Student {sid}: No images found")
                 continue
             
-            for fn in files:
-                path = os.path.join(folder, fn)
-                img = cv2.imread(path)
-                if img is None:
-                    continue
-                
-                # Use OpenCV face detection
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-                
-                if len(faces) == 0:
-                    continue
-                
-                # Use the first detected face
-                # Note: using fx, fy, fw, fh to avoid overwriting the y list variable
-                fx, fy, fw, fh = faces[0]
-                face = img[fy:fy+fh, fx:fx+fw]
-                face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-                face = cv2.resize(face, (32,32), interpolation=cv2.INTER_AREA)
-                emb = face.flatten().astype(np.float32) / 255.0
-                
-                if emb is None:
-                    continue
-                X.append(emb)
-                y.append(int(sid))
+            per_student[sid] = embs
+            n_images += len(embs)
+            cache_hits += hits
+            cache_misses += misses
             
-            processed += 1
             if progress_callback:
                 pct = int((processed/total_students)*80)  # training progress up to 80% during feature extraction
-                progress_callback(pct, f"Processed {processed}/{total_students} students ({len(X)} images)")
+                progress_callback(pct, f"Processed {processed}/{total_students} students ({n_images} images, "
+                                       f"{cache_hits} cached, {cache_misses} new)")
+
+        extracted = time.perf_counter()
+        TRAINING_PHASE_SECONDS.observe(extracted - started, phase="extract")
+        TRAINING_CACHE.inc(cache_hits, result="hit")
+        TRAINING_CACHE.inc(cache_misses, result="miss")
+
+        # assemble in directory order so the fit is deterministic whatever order workers finished in
+        for sid in student_dirs:
+            for emb in per_student.get(sid, []):
+                X.append(emb)
+                y.append(int(sid))
 
         if len(X) == 0:
+            TRAINING_RUNS.inc(status="no_data")
             if progress_callback:
                 progress_callback(0, "No training data found. Make sure students have face images.")
             return
@@ -167,18 +710,46 @@ def train_model_background(dataset_dir, progress_callback=None):
         X = np.stack(X)
         y = np.array(y)
 
-        # fit RandomForest
+        # held-out accuracy / latency of the served backend (and any others
+        # asked for), then pick the one to serve
+        backend = CLASSIFIER_BACKEND
+        candidates = evaluation_candidates(backend)
+        if progress_callback:
+            progress_callback(82, f"Evaluating {len(candidates)} classifier backend(s) on held-out faces...")
+        eval_started = time.perf_counter()
+        evaluation = evaluate_backends(X, y, candidates, FOREST_CONFIDENCE_THRESHOLD)
+        TRAINING_PHASE_SECONDS.observe(time.perf_counter() - eval_started, phase="evaluate")
+        if backend == "auto":
+            backend = select_backend(evaluation, CLASSIFIER_ACCURACY_FLOOR)
+        print(format_evaluation(evaluation))
+
         if progress_callback:
-            progress_callback(85, f"Training RandomForest with {len(X)} samples...")
-        clf = RandomForestClassifier(n_estimators=150, n_jobs=-1, random_state=42)
-        clf.fit(X, y)
+            progress_callback(85, f"Training {backend} classifier with {len(X)} samples "
+                                  f"({cache_hits} cached, {cache_misses} newly extracted)...")
+        fit_started = time.perf_counter()
+        clf = fit_classifier(backend, X, y)
+        TRAINING_PHASE_SECONDS.observe(time.perf_counter() - fit_started, phase="fit")
 
-        with open(MODEL_PATH, "wb") as f:
-            pickle.dump(clf, f)
+        # atomic write + in-memory swap; in-flight requests keep the old model
+        model_registry.swap(clf)
+        _record_classifier_report(backend, evaluation, len(X))
+        # the gallery is rebuilt from the same embeddings so both backends agree
+        gallery.replace_all(X, y, gallery_since)
+        gallery.save()
 
+        duration = time.perf_counter() - started
+        TRAINING_PHASE_SECONDS.observe(duration, phase="total")
+        TRAINING_LAST_DURATION.set(duration)
+        TRAINING_LAST_IMAGES.set(len(X))
+        TRAINING_IMAGES.inc(len(X))
+        TRAINING_RUNS.inc(status="success")
         if progress_callback:
-            progress_callback(100, "Training complete!")
+            accuracy = backend_accuracy(evaluation, backend)
+            accuracy = "n/a" if accuracy is None else f"{accuracy:.1%}"
+            progress_callback(100, f"Training complete! (serving the {backend} classifier, "
+                                   f"held-out accuracy {accuracy})")
     except Exception as e:
+        TRAINING_RUNS.inc(status="failed")
         import traceback
         error_msg = f"Training error: {str(e)}"
         if progress_callback:
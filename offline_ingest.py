@@ -0,0 +1,169 @@
+import os
+import math
+import time
+import cv2
+from video_streaming import RecognitionPipeline, STREAM_DETECTOR_BACKEND
+from face_tracker import VOTES_REQUIRED
+from detection_scheduler import DetectionScheduler, MOTION_THRESHOLD
+
+# ---- Offline ingestion of recorded video ----
+# Runs the live stream's pipeline (detect -> track -> embed -> recognize ->
+# mark_attendance) headless over recorded video files or directories of frame
+# images, as fast as frames decode: no camera, no overlay drawing, no JPEG
+# encoding, no real-time pacing. Used for overnight bulk marking of recorded
+# entrances (`flask ingest-recordings`) and for exercising the pipeline on
+# synthetic videos without a camera.
+#
+# Every `stride`-th frame is processed. Video frames in between are only
+# grabbed (demuxed, not decoded), and image files in between are not read.
+# The live tracker settles an identity after VOTES_REQUIRED agreeing frames;
+# at a stride those frames span stride times as much of the recording, so the
+# vote count is scaled down to cover the same span, but never below
+# MIN_VOTES_REQUIRED: a single frame must not be enough to mark someone.
+# Otherwise someone who walks past quickly is never sampled often enough to be
+# marked.
+#
+# Region passes follow the tracked faces between full-frame scans, as in the
+# live stream. A full scan runs whenever the DetectionScheduler's motion check
+# sees movement outside the tracked faces (someone new walking in), besides
+# the pipeline's periodic one.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".webm", ".mpg", ".mpeg")
+PROGRESS_INTERVAL_SEC = 10.0
+MIN_VOTES_REQUIRED = 2
+
+
+def iter_video_frames(path, stride=1):
+    """Yield (frame index, frame) for every stride-th frame of a video file."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    try:
+        index = 0
+        while True:
+            if index % stride:
+                if not cap.grab():
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_image_frames(folder, stride=1):
+    """Yield (frame index, image) for every stride-th image in a folder, in name order."""
+    files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for index in range(0, len(files), stride):
+        frame = cv2.imread(os.path.join(folder, files[index]))
+        if frame is None:
+            print(f"Skipping unreadable image {files[index]}")
+            continue
+        yield index, frame
+
+
+def iter_source_frames(path, stride=1):
+    if os.path.isdir(path):
+        return iter_image_frames(path, stride)
+    return iter_video_frames(path, stride)
+
+
+def expand_sources(paths):
+    """Video files and frame directories to ingest; directories are searched recursively."""
+    sources = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sources.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            files.sort()
+            if any(f.lower().endswith(IMAGE_EXTENSIONS) for f in files):
+                sources.append(root)
+            sources.extend(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+    return sources
+
+
+def votes_required_for_stride(stride):
+    """Votes that settle a track when only every stride-th frame is processed."""
+    return max(min(MIN_VOTES_REQUIRED, VOTES_REQUIRED), math.ceil(VOTES_REQUIRED / stride))
+
+
+def ingest_source(path, stride=1, attendance_date=None, detector_backend=STREAM_DETECTOR_BACKEND,
+                  progress_callback=None):
+    """
+    Run the recognition pipeline over one video file or frame directory.
+    Returns a summary dict with frame/face counts and throughput.
+    """
+    if stride < 1:
+        raise ValueError("stride must be >= 1")
+    pipeline = RecognitionPipeline(detector_backend, attendance_date, votes_required_for_stride(stride))
+    motion = DetectionScheduler()
+    overlay = []
+    processed = 0
+    last_index = -1
+    started = last_report = time.perf_counter()
+    for index, frame in iter_source_frames(path, stride):
+        motion.observe(frame, [face["bbox"] for face in overlay])
+        full_scan = True if motion.take_motion() >= MOTION_THRESHOLD else None
+        # frame numbers are the tracker's clock, so skipped frames still count as elapsed
+        overlay = pipeline.process(frame, index, full_scan=full_scan)
+        processed += 1
+        last_index = index
+        now = time.perf_counter()
+        if progress_callback and now - last_report >= PROGRESS_INTERVAL_SEC:
+            progress_callback(_summary(path, stride, processed, last_index + 1, pipeline.stats, now - started))
+            last_report = now
+    return _summary(path, stride, processed, last_index + 1, pipeline.stats, time.perf_counter() - started)
+
+
+def _summary(path, stride, processed, frames_seen, stats, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    return {
+        "source": path,
+        "stride": stride,
+        "frames_seen": frames_seen,
+        "frames_processed": processed,
+        "faces_detected": stats["faces_detected"],
+        "faces_recognized": stats["faces_recognized"],
+        "students_marked": stats["students_marked"],
+        "full_scans": stats["full_scans"],
+        "roi_passes": stats["roi_passes"],
+        "elapsed_sec": round(elapsed, 3),
+        "frames_per_sec": round(processed / elapsed, 2),
+        "faces_per_sec": round(stats["faces_detected"] / elapsed, 2),
+    }
+
+
+def format_summary(summary):
+    return (f"{summary['source']}: {summary['frames_processed']} frame(s) processed "
+            f"(stride {summary['stride']}, {summary['frames_seen']} seen) in {summary['elapsed_sec']:.1f}s - "
+            f"{summary['frames_per_sec']:.1f} frames/s, {summary['faces_per_sec']:.1f} faces/s, "
+            f"{summary['faces_detected']} face(s), {summary['faces_recognized']} classified, "
+            f"{summary['students_marked']} student(s) marked")
+
+
+def ingest_paths(paths, stride=1, attendance_date=None, detector_backend=STREAM_DETECTOR_BACKEND):
+    """Ingest every source under paths, printing per-source and overall throughput."""
+    summaries = []
+    for source in expand_sources(paths):
+        try:
+            summary = ingest_source(source, stride, attendance_date, detector_backend,
+                                    progress_callback=lambda s: print("  ... " + format_summary(s)))
+        except ValueError as e:
+            print(f"Skipping {source}: {e}")
+            continue
+        print(format_summary(summary))
+        summaries.append(summary)
+    if len(summaries) > 1:
+        elapsed = max(sum(s["elapsed_sec"] for s in summaries), 1e-9)
+        frames = sum(s["frames_processed"] for s in summaries)
+        faces = sum(s["faces_detected"] for s in summaries)
+        print(f"Total: {len(summaries)} source(s), {frames} frame(s) in {elapsed:.1f}s - "
+              f"{frames / elapsed:.1f} frames/s, {faces / elapsed:.1f} faces/s, "
+              f"{sum(s['students_marked'] for s in summaries)} student(s) marked")
+    return summaries
@@ -0,0 +1,165 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from model import decode_grayscale, image_dimensions, embed_faces_at
+
+# ---- Per-client cache of /recognize_face results ----
+# A kiosk (camera_mark.js) posts a frame every 1.2 s, and most of those frames
+# show the same scene as the one before. Each frame gets a fingerprint: a
+# 1/8-scale grayscale decode (about a millisecond for a 640x480 JPEG) shrunk to
+# a thumbnail, plus a 16x16 difference hash of that thumbnail. Each hash cell is
+# -1/0/+1 (darker / flat / brighter than its right neighbour) with a dead zone,
+# so sensor noise on flat walls does not flip cells the way a plain bit hash
+# does. When a client's new frame is close enough to the frame behind its last
+# full recognition, that result is returned without decode/detect/embed/predict.
+# "Close enough" means all of:
+#   - the hashes differ in at most RESULT_CACHE_MAX_DISTANCE cells,
+#   - the thumbnail patch under every previously found face box still matches
+#     within RESULT_CACHE_FACE_DELTA grey levels, and
+#   - the face embedding re-computed at every cached box (decode + crop only,
+#     no detection) is within RESULT_CACHE_MAX_EMBED_DISTANCE of the embedding
+#     the cached result was recognized from. The thumbnail checks are too coarse
+#     to tell two people in the same spot apart; this one confirms identity.
+# Entries expire RESULT_CACHE_TTL seconds after the full recognition that made
+# them and are never extended by hits. A still scene is therefore re-recognized
+# at least that often, which also picks up a retrained model. Only clients that
+# send a client_id form field (camera_mark.js does) are cached; other callers,
+# e.g. scripts sharing an address, always get a full recognition. Results
+# without any face box ("no face detected") are never cached: with no box to
+# compare, a small face walking into the frame would not break the match.
+
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "10"))  # seconds, 0 = disabled
+RESULT_CACHE_MAX_DISTANCE = int(os.environ.get("RESULT_CACHE_MAX_DISTANCE", "16"))  # of 256 hash cells
+RESULT_CACHE_FACE_DELTA = float(os.environ.get("RESULT_CACHE_FACE_DELTA", "12"))  # mean abs grey-level change
+# cosine distance; the same still face is ~0.0001, different people >= ~0.02
+RESULT_CACHE_MAX_EMBED_DISTANCE = float(os.environ.get("RESULT_CACHE_MAX_EMBED_DISTANCE", "0.01"))
+RESULT_CACHE_MAX_CLIENTS = 256
+
+THUMB_SIZE = (64, 48)
+HASH_SIZE = 16
+HASH_DEAD_ZONE = 2.0  # grey levels between neighbouring cells that still count as flat
+THUMB_DECODE_FACTOR = 8
+
+
+class Fingerprint:
+    __slots__ = ("cells", "thumb", "scale")
+
+    def __init__(self, cells, thumb, scale):
+        self.cells = cells    # int8[HASH_SIZE * HASH_SIZE] difference hash, -1/0/+1
+        self.thumb = thumb    # float32 THUMB_SIZE grayscale thumbnail
+        self.scale = scale    # (x, y) thumbnail pixels per full-resolution pixel
+
+
+def fingerprint(data):
+    """Fingerprint of an encoded image, or None if it cannot be decoded."""
+    small = decode_grayscale(data, THUMB_DECODE_FACTOR)
+    if small is None:
+        return None
+    dims = image_dimensions(data) or (small.shape[1] * THUMB_DECODE_FACTOR, small.shape[0] * THUMB_DECODE_FACTOR)
+    thumb = cv2.resize(small, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    grid = cv2.resize(thumb, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    diff = (grid[:, 1:] - grid[:, :-1]).ravel()
+    cells = (np.sign(diff) * (np.abs(diff) > HASH_DEAD_ZONE)).astype(np.int8)
+    return Fingerprint(cells, thumb, (THUMB_SIZE[0] / dims[0], THUMB_SIZE[1] / dims[1]))
+
+
+def _normalized(emb):
+    emb = np.asarray(emb, dtype=np.float32)
+    emb = emb - emb.mean()
+    norm = np.linalg.norm(emb)
+    return emb / norm if norm else emb
+
+
+def _face_patch(fp, box):
+    x, y, w, h = box
+    sx, sy = fp.scale
+    x1, y1 = int(x * sx), int(y * sy)
+    x2 = max(x1 + 1, int(np.ceil((x + w) * sx)))
+    y2 = max(y1 + 1, int(np.ceil((y + h) * sy)))
+    return fp.thumb[y1:y2, x1:x2]
+
+
+class RecognitionResultCache:
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_distance=RESULT_CACHE_MAX_DISTANCE,
+                 face_delta=RESULT_CACHE_FACE_DELTA, max_embed_distance=RESULT_CACHE_MAX_EMBED_DISTANCE,
+                 max_clients=RESULT_CACHE_MAX_CLIENTS):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.face_delta = face_delta
+        self.max_embed_distance = max_embed_distance
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # client -> (expires, fingerprint, embeddings, date, outcome, body)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _matches(self, old, new, body):
+        if np.count_nonzero(old.cells != new.cells) > self.max_distance:
+            return False
+        for face in body.get("faces", ()):
+            before, after = _face_patch(old, face["box"]), _face_patch(new, face["box"])
+            if before.size == 0 or before.shape != after.shape:
+                return False
+            if float(np.mean(np.abs(before - after))) > self.face_delta:
+                return False
+        return True
+
+    def _same_faces(self, data, embeddings, body):
+        boxes = [face["box"] for face in body.get("faces", ())]
+        if not boxes:
+            return True
+        current = embed_faces_at(data, boxes)
+        if current is None:
+            return False
+        return all(1.0 - float(_normalized(new) @ old) <= self.max_embed_distance
+                   for new, old in zip(current, embeddings))
+
+    def lookup(self, client, fp, data, attendance_date, now=None):
+        """(outcome, body) of the client's last result if this frame (encoded bytes `data`) matches it, else None."""
+        if not self.enabled or not client or fp is None:
+            return None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(client)
+        if entry is None:
+            return None
+        expires, old, embeddings, date, outcome, body = entry
+        if now >= expires or date != attendance_date or not self._matches(old, fp, body):
+            return None
+        if not self._same_faces(data, embeddings, body):
+            return None
+        body = copy.deepcopy(body)
+        # attendance was marked by the recognition that produced this result
+        for face in body.get("faces", ()):
+            if "attendance_marked" in face:
+                face["attendance_marked"] = False
+        body["cached"] = True
+        return outcome, body
+
+    def store(self, client, fp, embeddings, attendance_date, outcome, body, now=None):
+        """embeddings: one per face in body["faces"], as recognized. Results without faces are not stored."""
+        if not self.enabled or not client or fp is None:
+            return
+        if not body.get("faces") or len(embeddings) != len(body["faces"]):
+            return
+        now = time.monotonic() if now is None else now
+        embeddings = [_normalized(e) for e in embeddings]
+        with self._lock:
+            self._entries[client] = (now + self.ttl, fp, embeddings, attendance_date, outcome,
+                                     copy.deepcopy(body))
+            self._entries.move_to_end(client)
+            while len(self._entries) > self.max_clients:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+result_cache = RecognitionResultCache()
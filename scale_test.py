@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Scale test: training, recognition and reports at N students x M images.
+
+    python scale_test.py --students 100,1000,10000 --images 5
+    python scale_test.py --students 500 --images 10 --queries 200 -o scale.json
+
+Each N runs in its own child process against a fresh temporary dataset/ and
+SQLite DB (synthetic faces from synthetic_faces.py, 30 days of attendance
+history), so peak RSS is measured per scale and the real attendance.db,
+dataset/ and model.pkl are never touched. For every N it reports wall time per
+phase, peak RSS, model/gallery file size, recognition latency and accuracy,
+and report-route latency. A scale that crashes or runs out of memory is
+recorded as failed and the next one still runs.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_SIZE = 8
+REPORT_REPEAT = 3
+
+
+def peak_rss_mb(children=False):
+    import resource
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scale(n_students, images_per_student, queries, workers=None, seed=0):
+    """Run every phase for one scale in this process. Returns the result dict."""
+    workdir = tempfile.mkdtemp(prefix=f"attendance-scale-{n_students}-")
+    # db.py reads the path at import; model.pkl / gallery.npz live in the working directory
+    os.environ["ATTENDANCE_DB_PATH"] = os.path.join(workdir, "attendance.db")
+    os.environ.setdefault("ATTENDANCE_WRITE_MODE", "direct")
+    # every request must run the full pipeline, never the kiosk result cache
+    os.environ["RESULT_CACHE_TTL"] = "0"
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    try:
+        import app as app_module
+        import db
+        from model import train_model_background, MODEL_PATH, GALLERY_PATH
+        from synthetic_faces import build_dataset, insert_students, insert_attendance_history, face_jpeg
+        from benchmark import summarize
+
+        result = {"students": n_students, "images_per_student": images_per_student, "phases": {}}
+        phases = result["phases"]
+
+        def finish(name, started, **extra):
+            phases[name] = dict(wall_sec=round(time.perf_counter() - started, 3),
+                                peak_rss_mb=peak_rss_mb(), **extra)
+            print(f"[{n_students}] {name}: {phases[name]}", file=sys.stderr)
+
+        student_ids = list(range(1, n_students + 1))
+        dataset_dir = os.path.join(workdir, "dataset")
+
+        started = time.perf_counter()
+        n_files = build_dataset(dataset_dir, student_ids, images_per_student)
+        with db.pooled_connection() as conn:
+            insert_students(conn, student_ids)
+            n_rows = insert_attendance_history(conn, student_ids, seed=seed)
+        finish("generate", started, images=n_files, attendance_rows=n_rows)
+
+        started = time.perf_counter()
+        messages = []
+        train_model_background(dataset_dir, progress_callback=lambda p, m: messages.append(m), workers=workers)
+        if not os.path.exists(MODEL_PATH):
+            raise RuntimeError(f"training failed: {messages[-1] if messages else 'no model written'}")
+        finish("train", started,
+               model_mb=round(os.path.getsize(MODEL_PATH) / 1e6, 3),
+               gallery_mb=round(os.path.getsize(GALLERY_PATH) / 1e6, 3) if os.path.exists(GALLERY_PATH) else None,
+               children_peak_rss_mb=peak_rss_mb(children=True),
+               last_message=messages[-1] if messages else None)
+
+        client = app_module.app.test_client()
+        rng = random.Random(seed)
+        probes = [(sid, face_jpeg(sid, 10_000 + k)) for k, sid in
+                  enumerate(rng.choice(student_ids) for _ in range(queries))]
+
+        started = time.perf_counter()
+        samples, correct, no_face = [], 0, 0
+        for sid, jpeg in probes:
+            t0 = time.perf_counter()
+            resp = client.post("/recognize_face", data={"image": (io.BytesIO(jpeg), "probe.jpg")},
+                               content_type="multipart/form-data")
+            samples.append(time.perf_counter() - t0)
+            body = resp.get_json() or {}
+            if body.get("recognized") and body.get("student_id") == sid:
+                correct += 1
+            elif not body.get("faces"):
+                no_face += 1
+        finish("recognize_face", started, latency=summarize(samples),
+               accuracy=round(correct / len(probes), 4) if probes else None, no_face=no_face)
+
+        started = time.perf_counter()
+        samples = []
+        for i in range(0, len(probes), BATCH_SIZE):
+            batch = probes[i:i + BATCH_SIZE]
+            t0 = time.perf_counter()
+            client.post("/recognize_batch",
+                        data={"images[]": [(io.BytesIO(jpeg), f"{k}.jpg") for k, (_, jpeg) in enumerate(batch)]},
+                        content_type="multipart/form-data")
+            samples.append(time.perf_counter() - t0)
+        finish("recognize_batch", started, batch_size=BATCH_SIZE, latency=summarize(samples) if samples else None)
+
+        today = datetime.date.today().isoformat()
+        for name, url in (("present_students", f"/present_students?date={today}"),
+                          ("download_daily_attendance", f"/download_daily_attendance?date={today}"),
+                          ("attendance_stats", "/attendance_stats")):
+            started = time.perf_counter()
+            samples, size = [], 0
+            for _ in range(REPORT_REPEAT):
+                t0 = time.perf_counter()
+                resp = client.get(url)
+                size = len(resp.get_data())  # drains streamed responses
+                samples.append(time.perf_counter() - t0)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"{url} returned {resp.status_code}")
+            finish(name, started, latency=summarize(samples), response_bytes=size)
+
+        result["peak_rss_mb"] = peak_rss_mb()
+        result["children_peak_rss_mb"] = peak_rss_mb(children=True)
+        return result
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_child(n_students, args):
+    """Run one scale in a fresh interpreter; returns its result or an error record."""
+    fd, result_path = tempfile.mkstemp(prefix="attendance-scale-", suffix=".json")
+    os.close(fd)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", str(n_students),
+           "--images", str(args.images), "--queries", str(args.queries), "--result-file", result_path]
+    if args.workers:
+        cmd += ["--workers", str(args.workers)]
+    started = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, stdout=sys.stderr)
+        with open(result_path) as f:
+            text = f.read()
+        if proc.returncode == 0 and text:
+            return json.loads(text)
+        return {"students": n_students, "images_per_student": args.images,
+                "error": f"exit status {proc.returncode}", "wall_sec": round(time.perf_counter() - started, 3)}
+    finally:
+        os.remove(result_path)
+
+
+def format_table(results):
+    cols = ["students", "images", "train s", "model MB", "peak RSS MB", "recog p50 ms", "accuracy",
+            "daily CSV ms", "present ms"]
+    lines = [" | ".join(f"{c:>12}" for c in cols)]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['students']:>12} | failed: {r['error']}")
+            continue
+        p = r["phases"]
+        row = [r["students"], p["generate"]["images"], p["train"]["wall_sec"], p["train"]["model_mb"],
+               max(r["peak_rss_mb"], r["children_peak_rss_mb"]),
+               p["recognize_face"]["latency"]["median_ms"] if p["recognize_face"]["latency"]["n"] else "-",
+               p["recognize_face"]["accuracy"],
+               p["download_daily_attendance"]["latency"]["median_ms"],
+               p["present_students"]["latency"]["median_ms"]]
+        lines.append(" | ".join(f"{v:>12}" for v in row))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", default="100,1000",
+                        help="comma-separated student counts to test (e.g. 100,1000,10000)")
+    parser.add_argument("--images", type=int, default=5, help="face images per student")
+    parser.add_argument("--queries", type=int, default=50, help="/recognize_face requests per scale")
+    parser.add_argument("--workers", type=int, default=None, help="training extraction processes")
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        # the app logs with print(); progress goes to stderr, the result to --result-file
+        sys.stdout = sys.stderr
+        result = run_scale(args.child, args.images, args.queries, args.workers)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    scales = [int(s) for s in args.students.split(",") if s.strip()]
+    output_path = os.path.abspath(args.output) if args.output else None
+    results = [run_child(n, args) for n in scales]
+    print(format_table(results))
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump({"generated_at": datetime.datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,8 @@ const selectedDateDisplay = document.getElementById("selectedDateDisplay");
 let markStream = null;
 let markInterval = null;
 let recognizedIds = new Set();
+// lets the server return its previous result for an unchanged frame from this page
+const clientId = Math.random().toString(36).slice(2) + Date.now().toString(36);
 
 // Initialize date inputs
 document.addEventListener('DOMContentLoaded', function() {
@@ -78,20 +80,24 @@ async function captureAndRecognize() {
   const fd = new FormData();
   fd.append("image", blob, "snap.jpg");
   fd.append("attendance_date", getSelectedDateString());
+  fd.append("client_id", clientId);
   try {
     const res = await fetch("/recognize_face", { method: "POST", body: fd });
     const j = await res.json();
     if (j.recognized) {
-      markStatus.innerText = `Recognized: ${j.name} (conf ${Math.round(j.confidence*100)}%)`;
-      if (!recognizedIds.has(j.student_id)) {
-        recognizedIds.add(j.student_id);
+      // every recognized face in the frame (older servers only send the top-level match)
+      const matches = j.faces ? j.faces.filter(f => f.recognized) : [j];
+      markStatus.innerText = "Recognized: " + matches.map(f => `${f.name} (conf ${Math.round(f.confidence*100)}%)`).join(", ");
+      matches.forEach(f => {
+        if (recognizedIds.has(f.student_id)) return;
+        recognizedIds.add(f.student_id);
         const li = document.createElement("li");
         li.className = "list-group-item";
         const selectedDate = getSelectedDateString();
         const dateLabel = selectedDate === new Date().toISOString().split('T')[0] ? 'Today' : selectedDate;
-        li.innerText = `${j.name} — ${dateLabel} — ${new Date().toLocaleTimeString()}`;
+        li.innerText = `${f.name} — ${dateLabel} — ${new Date().toLocaleTimeString()}`;
         recognizedList.prepend(li);
-      }
+      });
     } else {
       if (j.error) markStatus.innerText = `Not recognized: ${j.error}`;
       else markStatus.innerText = `Not recognized`;
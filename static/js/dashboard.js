@@ -4,20 +4,52 @@ document.addEventListener("DOMContentLoaded", () => {
   const trainProgress = document.getElementById("trainProgress");
   const trainMsg = document.getElementById("trainMsg");
 
-  async function pollStatus() {
-    try {
-      const res = await fetch("/train_status");
-      const data = await res.json();
-      trainProgress.style.width = data.progress + "%";
-      trainProgress.innerText = data.progress + "%";
-      trainMsg.innerText = data.message || "";
-      return data;
-    } catch (e) {
-      console.error(e);
-      return null;
+  function showStatus(data) {
+    trainProgress.style.width = data.progress + "%";
+    trainProgress.innerText = data.progress + "%";
+    trainMsg.innerText = data.message || "";
+  }
+
+  function finishTraining(s) {
+    trainBtn.disabled = false;
+    if (s.progress >= 100) {
+      alert("Training completed successfully!");
+    } else if (s.message && (s.message.includes("error") || s.message.includes("No training") || s.message.includes("not found"))) {
+      alert("Training stopped: " + s.message);
     }
   }
 
+  // status pushed by the server as it changes; falls back to polling without EventSource
+  function followTraining(runId) {
+    if (window.EventSource) {
+      const source = new EventSource("/train_status/stream");
+      source.onmessage = (event) => {
+        const s = JSON.parse(event.data);
+        if (s.run_id !== runId) return;
+        showStatus(s);
+        if (!s.running) {
+          source.close();
+          finishTraining(s);
+        }
+      };
+      return;
+    }
+    const t = setInterval(async () => {
+      try {
+        const res = await fetch("/train_status");
+        const s = await res.json();
+        if (s.run_id !== runId) return;
+        showStatus(s);
+        if (!s.running) {
+          clearInterval(t);
+          finishTraining(s);
+        }
+      } catch (e) {
+        console.error(e);
+      }
+    }, 1500);
+  }
+
   trainBtn.addEventListener("click", async () => {
     trainBtn.disabled = true;
     const start = await fetch("/train_model");
@@ -26,27 +58,9 @@ document.addEventListener("DOMContentLoaded", () => {
       trainBtn.disabled = false;
       return;
     }
+    const started = await start.json();
     trainMsg.innerText = "Training started...";
-    // poll until progress==100 or not running
-    const t = setInterval(async () => {
-      const s = await pollStatus();
-      if (s) {
-        // Check if training is complete (progress 100) or stopped (not running)
-        if (s.progress >= 100 || (!s.running && s.progress > 0)) {
-          clearInterval(t);
-          trainBtn.disabled = false;
-          if (s.progress >= 100) {
-            alert("Training completed successfully!");
-          } else if (s.message && (s.message.includes("error") || s.message.includes("No training") || s.message.includes("not found"))) {
-            alert("Training stopped: " + s.message);
-          }
-        } else if (!s.running && s.progress === 0 && s.message.includes("error")) {
-          clearInterval(t);
-          trainBtn.disabled = false;
-          alert("Training failed: " + s.message);
-        }
-      }
-    }, 1500);
+    followTraining(started.run_id);
   });
 
   // Chart initial render & update every 10s
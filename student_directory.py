@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+import db
+from db import DB_PATH
+
+# ---- In-process student id -> name cache ----
+# Recognition resolves names from memory instead of opening a connection per
+# face. This process updates the cache directly on add/delete; changes made by
+# other processes are picked up through a version check that runs at most once
+# every CHECK_INTERVAL seconds:
+#   1. PRAGMA data_version on a dedicated connection (changes on any commit by
+#      another connection, no table read)
+#   2. only if that moved, read student_directory_version.version, which the
+#      triggers below bump on every students INSERT/UPDATE/DELETE, so attendance
+#      inserts do not force a reload.
+
+CHECK_INTERVAL = 2.0
+
+SCHEMA_SQL = [
+    """CREATE TABLE IF NOT EXISTS student_directory_version (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL
+       )""",
+    "INSERT OR IGNORE INTO student_directory_version (id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS trg_students_ins AFTER INSERT ON students
+       BEGIN UPDATE student_directory_version SET version = version + 1 WHERE id = 1; END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_students_upd AFTER UPDATE ON students
+       BEGIN UPDATE student_directory_version SET version = version + 1 WHERE id = 1; END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_students_del AFTER DELETE ON students
+       BEGIN UPDATE student_directory_version SET version = version + 1 WHERE id = 1; END""",
+]
+
+
+def init_schema(cursor):
+    """Create the version table and triggers (called from init_db)."""
+    for stmt in SCHEMA_SQL:
+        cursor.execute(stmt)
+
+
+class StudentDirectory:
+    def __init__(self, db_path=DB_PATH, check_interval=CHECK_INTERVAL):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._names = None
+        self._data_version = None
+        self._students_version = None
+        self._last_check = 0.0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def _read_students_version(self, c):
+        try:
+            c.execute("SELECT version FROM student_directory_version WHERE id = 1")
+            row = c.fetchone()
+            return row[0] if row else 0
+        except sqlite3.OperationalError:
+            # table not created yet (init_db not run in this DB)
+            return None
+
+    def _reload(self):
+        c = self._connection().cursor()
+        self._data_version = c.execute("PRAGMA data_version").fetchone()[0]
+        self._students_version = self._read_students_version(c)
+        c.execute("SELECT id, name FROM students")
+        self._names = {row[0]: row[1] for row in c.fetchall()}
+        self._last_check = time.monotonic()
+
+    def warm(self):
+        with self._lock:
+            try:
+                self._reload()
+            except sqlite3.Error as e:
+                print(f"Student directory warm-up failed: {e}")
+                self._names = None
+
+    def _check_for_changes(self, force=False):
+        # caller holds the lock
+        now = time.monotonic()
+        if self._names is None:
+            self._reload()
+            return
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        c = self._connection().cursor()
+        data_version = c.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        if self._read_students_version(c) != self._students_version:
+            self._reload()
+
+    def get_name(self, student_id):
+        """Name for student_id, or None if no such student."""
+        student_id = int(student_id)
+        names = self._names
+        if names is not None and student_id in names and time.monotonic() - self._last_check < self.check_interval:
+            return names[student_id]
+        with self._lock:
+            try:
+                self._check_for_changes()
+                if student_id not in self._names:
+                    # may have been added by another process since the last check
+                    self._check_for_changes(force=True)
+            except sqlite3.Error as e:
+                print(f"Student directory error: {e}")
+                return (self._names or {}).get(student_id)
+            return self._names.get(student_id)
+
+    def put(self, student_id, name):
+        with self._lock:
+            if self._names is not None:
+                names = dict(self._names)
+                names[int(student_id)] = name
+                self._names = names
+
+    def remove(self, student_id):
+        with self._lock:
+            if self._names is not None and int(student_id) in self._names:
+                names = dict(self._names)
+                del names[int(student_id)]
+                self._names = names
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+
+
+student_directory = StudentDirectory()
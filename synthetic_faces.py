@@ -0,0 +1,100 @@
+import os
+import datetime
+import cv2
+import numpy as np
+
+# ---- Synthetic faces for benchmarks and scale tests ----
+# Drawn cartoon faces (skin ellipse, eyes, brows, nose, mouth) that the Haar
+# cascade detects reliably. The shape and colours come from the identity seed,
+# so one student's images match each other. Each image of a student adds a
+# small shift, brightness change and sensor noise. Nothing here needs a camera
+# or real photos.
+
+FACE_SIZE = 200
+
+
+def synthetic_face(identity, size=FACE_SIZE):
+    """BGR image (2*size square) holding one face whose features depend on identity."""
+    rng = np.random.default_rng(identity)
+    img = np.full((size * 2, size * 2, 3), 40, np.uint8)
+    skin = tuple(int(v) for v in rng.integers(120, 230, 3))
+    cv2.ellipse(img, (size, size), (int(size * rng.uniform(.34, .42)), int(size * .5)), 0, 0, 360, skin, -1)
+    ey = int(size * rng.uniform(.8, .9))
+    dx = int(size * rng.uniform(.13, .19))
+    for sx in (-1, 1):
+        cv2.ellipse(img, (size + sx * dx, ey), (int(size * .08), int(size * rng.uniform(.03, .05))),
+                    0, 0, 360, (30, 30, 30), -1)
+        cv2.line(img, (size + sx * dx - 20, ey - 25), (size + sx * dx + 20, ey - int(rng.integers(20, 35))),
+                 (40, 40, 40), 6)
+    cv2.line(img, (size, ey + 10), (size, int(size * 1.1)), (120, 130, 150), 5)
+    cv2.ellipse(img, (size, int(size * rng.uniform(1.2, 1.3))), (int(size * rng.uniform(.1, .2)), int(size * .05)),
+                0, 0, 360, (60, 60, 120), -1)
+    return cv2.GaussianBlur(img, (9, 9), 0)
+
+
+def face_variant(identity, variant, size=FACE_SIZE):
+    """One "photo" of identity: the base face with a variant-seeded shift, brightness and noise."""
+    img = synthetic_face(identity, size)
+    if variant is None:
+        return img
+    rng = np.random.default_rng((identity, variant))
+    shift = np.float32([[1, 0, rng.integers(-8, 9)], [0, 1, rng.integers(-8, 9)]])
+    img = cv2.warpAffine(img, shift, (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+    noise = rng.integers(-8, 9, img.shape) + int(rng.integers(-15, 16))
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(img, quality=90):
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def face_jpeg(identity, variant=None, size=FACE_SIZE):
+    return encode_jpeg(face_variant(identity, variant, size))
+
+
+def build_dataset(dataset_dir, student_ids, images_per_student, size=FACE_SIZE):
+    """Write dataset_dir/<student_id>/<n>.jpg for every student. Returns the number of files written."""
+    written = 0
+    for sid in student_ids:
+        folder = os.path.join(dataset_dir, str(sid))
+        os.makedirs(folder, exist_ok=True)
+        for n in range(images_per_student):
+            with open(os.path.join(folder, f"{n}.jpg"), "wb") as f:
+                f.write(face_jpeg(sid, n, size))
+            written += 1
+    return written
+
+
+def insert_students(conn, student_ids, classes=("10", "11", "12"), sections=("A", "B")):
+    """Insert placeholder student rows (ids as given) and commit."""
+    now = datetime.datetime.utcnow().isoformat()
+    conn.executemany(
+        "INSERT OR IGNORE INTO students (id, name, email, roll, class, section, reg_no, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(sid, f"Student {sid}", f"student{sid}@example.com", str(sid),
+          classes[sid % len(classes)], sections[sid % len(sections)], f"REG{sid:06d}", now)
+         for sid in student_ids])
+    conn.commit()
+
+
+def insert_attendance_history(conn, student_ids, days=30, present_ratio=0.6, seed=0):
+    """Mark a random present_ratio of students on each of the last `days` days (today included).
+
+    Returns the number of attendance rows inserted.
+    """
+    rng = np.random.default_rng(seed)
+    names = {sid: f"Student {sid}" for sid in student_ids}
+    today = datetime.date.today()
+    inserted = 0
+    for back in range(days):
+        day = (today - datetime.timedelta(days=back)).isoformat()
+        present = [sid for sid in student_ids if rng.random() < present_ratio]
+        conn.executemany(
+            "INSERT OR IGNORE INTO attendance (student_id, name, timestamp, attendance_date) VALUES (?, ?, ?, ?)",
+            [(sid, names[sid], f"{day}T09:00:00.000000", day) for sid in present])
+        inserted += len(present)
+    conn.commit()
+    return inserted
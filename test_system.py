@@ -6,6 +6,33 @@ Run this after installing dependencies to check if everything works.
 
 import sys
 import os
+import json
+import shutil
+import tempfile
+import textwrap
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_isolated(script, timeout=300):
+    """Run a Python snippet in a child process with its own temporary SQLite DB
+    (initialised by the app's own init_db) and working directory, so the real
+    attendance.db, dataset/ and model files are never touched. Returns the JSON
+    value the snippet prints last."""
+    workdir = tempfile.mkdtemp(prefix="attendance-test-")
+    try:
+        env = dict(os.environ, ATTENDANCE_DB_PATH=os.path.join(workdir, "attendance.db"),
+                   ATTENDANCE_WRITE_MODE="direct", RECOGNITION_BACKEND="gallery",
+                   PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        # importing app creates the schema through init_db(), as on a real start
+        script = "import app\n" + textwrap.dedent(script)
+        proc = subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env,
+                              capture_output=True, text=True, timeout=timeout)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "child failed")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
 
 def test_imports():
     """Test if all required modules can be imported."""
@@ -65,6 +92,178 @@ def test_model_import():
         print(f"[FAIL] model.py import failed: {e}")
         return False
 
+def test_embedding_gallery():
+    """Test gallery add/remove, the distance threshold, reloads and rebuilds during enrolment."""
+    print("\nTesting embedding gallery...")
+    try:
+        import numpy as np
+        from model import EmbeddingGallery
+        rng = np.random.default_rng(0)
+        alice, bob = rng.normal(size=(2, 64))
+        workdir = tempfile.mkdtemp(prefix="attendance-test-")
+        try:
+            gallery = EmbeddingGallery(os.path.join(workdir, "gallery.npz"), threshold=0.25)
+            if gallery.add(1, np.stack([alice, alice * 2 + 1])) != 2 or gallery.add(2, bob[None, :]) != 1:
+                print("[FAIL] Gallery add did not report the rows added")
+                return False
+            near = alice + rng.normal(scale=0.05, size=64)
+            if gallery.match(near)[0] != 1 or gallery.match(bob)[0] != 2:
+                print("[FAIL] Enrolled faces are not matched to their student")
+                return False
+            if gallery.match(rng.normal(size=64))[0] is not None:
+                print("[FAIL] A face beyond the distance threshold was matched")
+                return False
+            gallery.save()
+            if gallery.remove(1) != 2 or gallery.match(near)[0] == 1 or list(gallery.labels()) != [2]:
+                print("[FAIL] Removed student is still matched")
+                return False
+            other = EmbeddingGallery(gallery.path)
+            if not other.load() or len(other) != 3 or other.match(near)[0] != 1:
+                print("[FAIL] Saved gallery did not load back")
+                return False
+            try:
+                gallery.add(3, rng.normal(size=(1, 32)))
+                print("[FAIL] Embedding of the wrong size was accepted")
+                return False
+            except ValueError:
+                pass
+            # student 3 enrolls and student 2 is deleted while a training run (which read both) is going
+            since = gallery.generation()
+            carol = rng.normal(size=64)
+            gallery.add(3, carol[None, :])
+            gallery.remove(2)
+            gallery.replace_all(np.stack([alice, bob]), [1, 2], since)
+            if sorted(gallery.labels()) != [1, 3]:
+                print(f"[FAIL] Rebuild kept students {sorted(gallery.labels())}, expected [1, 3]")
+                return False
+            gallery.save()
+            if other.match(carol)[0] != 3 or other.match(bob)[0] is not None:
+                print("[FAIL] Another process's gallery did not pick up the saved changes")
+                return False
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print("[OK] Embedding gallery works")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Embedding gallery check failed: {e}")
+        return False
+
+def test_result_cache():
+    """Test that a cached "no face" result is not served once a face appears."""
+    print("\nTesting recognition result cache...")
+    try:
+        import cv2
+        import numpy as np
+        from result_cache import RecognitionResultCache, fingerprint
+        from synthetic_faces import face_variant, encode_jpeg
+        cache = RecognitionResultCache(ttl=10)
+        empty = np.full((480, 640, 3), 128, np.uint8)
+        data = encode_jpeg(empty)
+        cache.store("kiosk", fingerprint(data), [], "2024-05-06", "no_face",
+                    {"recognized": False, "error": "no face detected"}, now=0)
+        # a small face changes few hash cells; it must still miss
+        with_face = empty.copy()
+        with_face[40:120, 40:120] = cv2.resize(face_variant(1, 0), (80, 80))
+        data = encode_jpeg(with_face)
+        if cache.lookup("kiosk", fingerprint(data), data, "2024-05-06", now=1) is not None:
+            print("[FAIL] Stale no-face result served for a frame with a face")
+            return False
+        print("[OK] No-face results are not served from the cache")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Result cache check failed: {e}")
+        return False
+
+def test_training_status():
+    """Test that a worker without the run re-reads the status record only when it changes."""
+    print("\nTesting cross-process training status...")
+    try:
+        from unittest import mock
+        import training_status
+        workdir = tempfile.mkdtemp(prefix="attendance-test-")
+        try:
+            path = os.path.join(workdir, "train_status.json")
+            owner, other = training_status.TrainingStatus(path), training_status.TrainingStatus(path)
+            with mock.patch.object(training_status.json, "load", wraps=training_status.json.load) as load:
+                owner.start()
+                owner.update(50, "Extracting features")
+                polls = [other.snapshot()["running"] for _ in range(20)]
+                reads_while_running = load.call_count
+                owner.update(100, "Training complete")
+                final = [other.snapshot() for _ in range(20)][-1]
+                reads = load.call_count
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if not all(polls) or final["running"] or final["message"] != "Training complete":
+            print(f"[FAIL] Other worker saw {polls[-1]} / {final}")
+            return False
+        if reads_while_running != 1 or reads != 2:
+            print(f"[FAIL] Status record parsed {reads} times for 40 polls, expected 2")
+            return False
+        print("[OK] Training status record is re-read only when it changes")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Training status check failed: {e}")
+        return False
+
+def test_reduced_decode():
+    """Test that a large upload is detected at reduced size with boxes in full-resolution pixels."""
+    print("\nTesting reduced-resolution decode...")
+    try:
+        import io
+        import cv2
+        import numpy as np
+        import model
+        from synthetic_faces import face_variant, encode_jpeg
+        frame = np.full((960, 1280, 3), 128, np.uint8)
+        frame[200:600, 400:800] = cv2.resize(face_variant(1, 0), (400, 400))
+        data = encode_jpeg(frame)
+        factor = model.reduction_factor(data, 640)
+        gray = model.decode_grayscale(data, factor)
+        if factor != 2 or gray.shape != (480, 640):
+            print(f"[FAIL] 1280x960 upload decoded at factor {factor}, shape {gray.shape}")
+            return False
+        faces = model.extract_embeddings_for_image(io.BytesIO(data))
+        if len(faces) != 1:
+            print(f"[FAIL] Expected one face in the upload, found {len(faces)}")
+            return False
+        x, y, w, h = faces[0][0]
+        if not (400 <= x + w / 2 <= 800 and 200 <= y + h / 2 <= 600):
+            print(f"[FAIL] Face box {faces[0][0]} is not in full-resolution coordinates")
+            return False
+        print("[OK] Large uploads are decoded at reduced size")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Reduced decode check failed: {e}")
+        return False
+
+def test_face_detector():
+    """Test that the shared face detector loads once per thread and runs."""
+    print("\nTesting shared face detector...")
+    try:
+        import threading
+        import numpy as np
+        from face_detector import get_detector, detect_faces
+        det = get_detector()
+        if get_detector() is not det:
+            print("[FAIL] Detector is rebuilt on every call")
+            return False
+        other = []
+        t = threading.Thread(target=lambda: other.append(get_detector()))
+        t.start()
+        t.join()
+        if other[0] is det:
+            print("[FAIL] Detector instance is shared between threads")
+            return False
+        if detect_faces(np.zeros((480, 640, 3), np.uint8)) != []:
+            print("[FAIL] Faces detected in a blank frame")
+            return False
+        print("[OK] Shared face detector works")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Face detector check failed: {e}")
+        return False
+
 def test_app_structure():
     """Test if app.py structure is valid."""
     print("\nTesting app.py structure...")
@@ -107,6 +306,155 @@ def test_database_init():
         print(f"[FAIL] Database initialization failed: {e}")
         return False
 
+def test_attendance_writer():
+    """Test that the queued attendance writer resolves Futures and ignores duplicates."""
+    print("\nTesting queued attendance writer...")
+    try:
+        result = run_isolated("""
+            import json
+            from concurrent.futures import Future
+            import db
+            from attendance_utils import AttendanceWriter
+
+            writer = AttendanceWriter(db.DB_PATH)
+            futures = [writer.submit(1, "Student 1", "2024-05-06"),
+                       writer.submit(1, "Student 1", "2024-05-06"),
+                       writer.submit(2, "Student 2", "2024-05-06"),
+                       writer.submit(1, "Student 1", "2024-05-07")]
+            marked = [f.result(timeout=10) for f in futures]
+            writer.stop()
+            with db.pooled_connection() as conn:
+                rows = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+            print(json.dumps({"futures": all(isinstance(f, Future) for f in futures),
+                              "marked": marked, "rows": rows}))
+        """)
+        if result != {"futures": True, "marked": [True, False, True, True], "rows": 3}:
+            print(f"[FAIL] Unexpected writer results: {result}")
+            return False
+        print("[OK] Queued writer marks once per student and day")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Attendance writer check failed: {e}")
+        return False
+
+def test_daily_rollup():
+    """Test that the daily attendance rollup follows inserts and deletes."""
+    print("\nTesting daily attendance rollup...")
+    try:
+        result = run_isolated("""
+            import json
+            import db
+            from attendance_utils import daily_attendance_counts, rebuild_daily_rollup
+
+            with db.pooled_connection() as conn:
+                conn.executemany("INSERT INTO attendance (student_id, name, timestamp, attendance_date) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 [(1, "Student 1", "2024-05-06T09:00:00", "2024-05-06"),
+                                  (2, "Student 2", "2024-05-06T09:05:00", "2024-05-06"),
+                                  (1, "Student 1", "2024-05-07T09:00:00", "2024-05-07")])
+                # writers that only set timestamp are counted by its date
+                conn.execute("INSERT INTO attendance (student_id, name, timestamp) "
+                             "VALUES (3, 'Student 3', '2024-05-07T10:00:00')")
+                conn.commit()
+                after_insert = daily_attendance_counts("2024-05-01", "2024-05-31")
+                conn.execute("DELETE FROM attendance WHERE student_id = 1")
+                conn.commit()
+            after_delete = daily_attendance_counts("2024-05-01", "2024-05-31")
+            rebuild_daily_rollup()
+            rebuilt = daily_attendance_counts("2024-05-01", "2024-05-31")
+            print(json.dumps([after_insert, after_delete, rebuilt]))
+        """)
+        expected = [{"2024-05-06": 2, "2024-05-07": 2}, {"2024-05-06": 1, "2024-05-07": 1},
+                    {"2024-05-06": 1, "2024-05-07": 1}]
+        if result != expected:
+            print(f"[FAIL] Rollup counts {result}, expected {expected}")
+            return False
+        print("[OK] Daily rollup stays in step with the attendance table")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Daily rollup check failed: {e}")
+        return False
+
+def test_attendance_records_api():
+    """Test that /attendance_records pages through tied timestamps without gaps or repeats."""
+    print("\nTesting attendance records pagination...")
+    try:
+        result = run_isolated("""
+            import json
+            import db
+            from app import app
+
+            with db.pooled_connection() as conn:
+                # five rows share one timestamp, so only the id breaks the tie
+                conn.executemany("INSERT INTO attendance (student_id, name, timestamp, attendance_date) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 [(sid, f"Student {sid}", "2024-05-06T09:00:00" if sid <= 5 else
+                                   f"2024-05-06T10:0{sid}:00", "2024-05-06") for sid in range(1, 9)])
+                conn.commit()
+            client = app.test_client()
+            seen, cursor = [], ""
+            while True:
+                page = client.get(f"/attendance_records?limit=2&cursor={cursor}").get_json()
+                seen.extend(r["id"] for r in page["records"])
+                if not page["has_more"]:
+                    break
+                cursor = page["next_cursor"]
+            bad = client.get("/attendance_records?cursor=not-a-cursor").status_code
+            print(json.dumps({"ids": seen, "bad_cursor": bad}))
+        """)
+        expected = {"ids": [8, 7, 6, 5, 4, 3, 2, 1], "bad_cursor": 400}
+        if result != expected:
+            print(f"[FAIL] Pagination returned {result}, expected {expected}")
+            return False
+        print("[OK] Keyset pagination is stable and rejects bad cursors")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Attendance records check failed: {e}")
+        return False
+
+def test_offline_ingest():
+    """Test that a student who passes the camera briefly is marked from a recording read at a stride."""
+    print("\nTesting offline ingestion...")
+    try:
+        rows = run_isolated("""
+            import os, json, cv2, numpy as np
+            import db, model
+            from synthetic_faces import build_dataset, insert_students, face_variant
+            from offline_ingest import ingest_source
+
+            with db.pooled_connection() as conn:
+                insert_students(conn, [1, 2])
+            build_dataset("dataset", [1, 2], 4)
+            for sid in (1, 2):
+                folder = os.path.join("dataset", str(sid))
+                model.enroll_student_images(sid, [os.path.join(folder, f) for f in sorted(os.listdir(folder))])
+
+            # 60 frames (2 s at 30 fps): student 1 stands on the left throughout,
+            # student 2 walks past on the right in frames 25-34 only
+            os.makedirs("frames")
+            for i in range(60):
+                frame = np.full((480, 640, 3), 128, np.uint8)
+                frame[140:340, 20:220] = cv2.resize(face_variant(1, 0), (200, 200))
+                if 25 <= i < 35:
+                    x = 300 + (i - 25) * 5
+                    frame[140:340, x:x + 200] = cv2.resize(face_variant(2, i), (200, 200))
+                cv2.imwrite(os.path.join("frames", f"{i:04d}.jpg"), frame)
+
+            ingest_source("frames", stride=5, attendance_date="2024-05-06")
+            with db.pooled_connection() as conn:
+                print(json.dumps(conn.execute(
+                    "SELECT student_id, attendance_date FROM attendance ORDER BY student_id").fetchall()))
+        """)
+        expected = [[1, "2024-05-06"], [2, "2024-05-06"]]
+        if rows != expected:
+            print(f"[FAIL] Expected both students marked on 2024-05-06, got {rows}")
+            return False
+        print("[OK] Offline ingestion marks attendance from a strided recording")
+        return True
+    except Exception as e:
+        print(f"[FAIL] Offline ingestion check failed: {e}")
+        return False
+
 def main():
     print("=" * 50)
     print("Face Detection Attendance System - Test Script")
@@ -115,8 +463,17 @@ def main():
     results = []
     results.append(("Imports", test_imports()))
     results.append(("Model Import", test_model_import()))
+    results.append(("Embedding Gallery", test_embedding_gallery()))
+    results.append(("Result Cache", test_result_cache()))
+    results.append(("Training Status", test_training_status()))
+    results.append(("Reduced Decode", test_reduced_decode()))
+    results.append(("Face Detector", test_face_detector()))
     results.append(("App Structure", test_app_structure()))
     results.append(("Database", test_database_init()))
+    results.append(("Attendance Writer", test_attendance_writer()))
+    results.append(("Daily Rollup", test_daily_rollup()))
+    results.append(("Records API", test_attendance_records_api()))
+    results.append(("Offline Ingestion", test_offline_ingest()))
     
     print("\n" + "=" * 50)
     print("Test Summary:")
@@ -0,0 +1,187 @@
+import os
+import json
+import datetime
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---- Training progress, held in memory ----
+# The process running a training job owns its live state: progress callbacks
+# update it under a lock and wake every waiter, so /train_status answers from
+# memory and /train_status/stream pushes each change to the dashboard as it
+# happens instead of being polled.
+#
+# The JSON file is the durable, cross-process record: written when a run starts
+# and when it ends, never per progress step. A process with no run of its own
+# (another server worker, or a restarted server) answers from that record, so
+# it sees that a run is in progress and how the last one ended. The parsed
+# record is cached against the file's stat, so polls and stream ticks cost one
+# stat() until the owner writes a new record.
+#
+# Only one run at a time across processes: start() takes an exclusive lock on
+# <status file>.lock and holds it until the run finishes. The OS drops the lock
+# if the process dies, so a record that says "running" while nobody holds the
+# lock is reported as interrupted.
+
+IDLE_STATUS = {"running": False, "progress": 0, "message": "No training yet."}
+INTERRUPTED_MESSAGE = "Training was interrupted (the process running it stopped)."
+
+
+def is_final(progress, message):
+    """True when a progress callback reports the end of a run (success or failure)."""
+    text = (message or "").lower()
+    return progress >= 100 or "error" in text or "not found" in text or "no training" in text
+
+
+def _try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+
+class TrainingStatus:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._cond = threading.Condition()
+        self._version = 0
+        self._lock_file = None  # open while this process owns a run
+        self._record = None
+        self._record_key = None  # (mtime_ns, size, inode) of the file self._record was parsed from
+        self._state = self._read_record()
+
+    # -- durable record --
+    def _read_record(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return dict(IDLE_STATUS, run_id=0)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key != self._record_key:
+            try:
+                with open(self.path, "r") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                return dict(IDLE_STATUS, run_id=0)
+            self._record, self._record_key = record, key
+        state = dict(self._record)
+        state.setdefault("run_id", 0)
+        if state.get("running") and not self._locked_elsewhere():
+            state.update(running=False, message=INTERRUPTED_MESSAGE)
+        return state
+
+    def _locked_elsewhere(self):
+        try:
+            with open(self.lock_path, "a+") as f:
+                if not _try_lock(f):
+                    return True
+                _unlock(f)
+                return False
+        except OSError:
+            return False
+
+    def _persist(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Could not write training status record: {e}")
+
+    def _changed(self):
+        self._version += 1
+        self._cond.notify_all()
+
+    def _current_state(self):
+        # caller holds self._cond
+        if self._lock_file is None:
+            # no run of our own: another process may have started or finished one
+            self._state = self._read_record()
+        return dict(self._state)
+
+    # -- public API --
+    def snapshot(self):
+        with self._cond:
+            return self._current_state()
+
+    def current(self):
+        with self._cond:
+            return self._version, self._current_state()
+
+    def start(self):
+        """Mark a new run as started. Returns its run id, or None if a run is already in progress."""
+        with self._cond:
+            if self._lock_file is not None:
+                return None
+            try:
+                lock_file = open(self.lock_path, "a+")
+            except OSError as e:
+                print(f"Could not open training lock {self.lock_path}: {e}")
+                return None
+            if not _try_lock(lock_file):
+                lock_file.close()
+                return None
+            self._lock_file = lock_file
+            last_run = self._read_record().get("run_id", 0)
+            self._state = {"running": True, "progress": 0, "message": "Starting training",
+                           "run_id": last_run + 1,
+                           "started_at": datetime.datetime.now().isoformat(), "finished_at": None}
+            self._persist()
+            self._changed()
+            return self._state["run_id"]
+
+    def update(self, progress, message):
+        """Progress callback for train_model_background."""
+        with self._cond:
+            if self._lock_file is None:
+                return
+            self._state.update(running=not is_final(progress, message), progress=progress, message=message)
+            if not self._state["running"]:
+                self._end_run()
+            self._changed()
+
+    def finish(self):
+        """Close the run if training returned without reporting a final status."""
+        with self._cond:
+            if self._lock_file is None:
+                return
+            message = self._state.get("message") or "stopped"
+            self._state.update(running=False, message=f"Training error: {message}")
+            self._end_run()
+            self._changed()
+
+    def _end_run(self):
+        # caller holds self._cond
+        self._state["finished_at"] = datetime.datetime.now().isoformat()
+        self._persist()
+        _unlock(self._lock_file)
+        self._lock_file.close()
+        self._lock_file = None
+
+    def wait_for_change(self, version, timeout):
+        """Block until this process's state moves past `version` (or timeout). Returns (version, state)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version, self._current_state()
@@ -1,216 +1,517 @@
+import os
+import atexit
 import cv2
-import mediapipe as mp
-import numpy as np
-from flask import Response
 import threading
 import time
+from collections import deque
+from flask import Blueprint, Response, jsonify
+from face_detector import get_detector
+from face_tracker import FaceTracker, iou, MAX_EXTRAPOLATION, VOTES_REQUIRED
+from detection_scheduler import DetectionScheduler, FULL_SCAN_INTERVAL
+from model import embed_face, recognize_embeddings
+from attendance_utils import mark_attendance
+from student_directory import student_directory
+from metrics import registry as metrics_registry
 
-# Initialize MediaPipe Face Detection with Crowd Mode settings
-mp_face_detection = mp.solutions.face_detection
-mp_drawing = mp.solutions.drawing_utils
+# ---- Shared camera broadcast ----
+# One capture thread owns the camera no matter how many browsers are watching
+# /video_feed:
+#   capture thread   -> reads frames into a small latest-frame ring buffer,
+#                       draws the latest detections on them, JPEG-encodes each
+#                       frame once and wakes every subscriber
+#   detection worker -> when the DetectionScheduler says a pass is due (motion,
+#                       new faces, tracking cadence, latency budget), takes the
+#                       newest frame from the ring buffer, runs detection +
+#                       recognition + attendance marking, and publishes the
+#                       boxes for the capture thread to draw
+# Detection never blocks capture or encoding; a slow detection pass just means
+# the worker skips ahead to the newest frame. The camera is released once the
+# last client has been gone for IDLE_SHUTDOWN_SEC and reopened by the next one.
+
+# CAMERA_SOURCE is a device index ("0") or a video file / stream URL.
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+CAMERA_FPS = 30
+JPEG_QUALITY = 80
+
+RING_SIZE = 4             # frames kept for the detection worker
+IDLE_SHUTDOWN_SEC = 2.0   # grace period before the camera is released
+
+# Crowd Mode: the stream asks the shared detector for the MediaPipe long-range
+# model (detects small faces); face_detector falls back to Haar if MediaPipe
+# is not installed. Tune it with face_detector.configure().
+STREAM_DETECTOR_BACKEND = "mediapipe"
+
+
+def _parse_source(source):
+    source = str(source)
+    return int(source) if source.isdigit() else source
+
+
+class RecognitionPipeline:
+    """
+    Detection -> tracking -> embedding -> recognition -> attendance for frames.
+
+    Faces are followed by a FaceTracker between passes. A pass is either a
+    full-frame scan or, while faces are being tracked, a search of the regions
+    around them only; the caller decides which (the live stream asks its
+    DetectionScheduler), otherwise a full scan runs every FULL_SCAN_INTERVAL
+    frames or whenever nothing is tracked. Only tracks whose identity is still being
+    voted on (or is due for re-verification) are embedded and classified, and
+    attendance is marked once a track's vote settles on a student, at most
+    once per minute per student. votes_required is the number of agreeing
+    votes that settles a track (see face_tracker.VOTES_REQUIRED).
+    """
+
+    def __init__(self, detector_backend=STREAM_DETECTOR_BACKEND, attendance_date=None,
+                 votes_required=VOTES_REQUIRED):
+        self.detector_backend = detector_backend
+        self.attendance_date = attendance_date  # None = today
+        self.votes_required = votes_required
+        self.tracker = FaceTracker(votes_required)
+        self.processed_faces = {}
+        self._last_cleanup = time.time()
+        self._last_full_scan = None
+        self._last_error = None
+        self.stats = {"full_scans": 0, "roi_passes": 0, "faces_detected": 0, "faces_recognized": 0,
+                      "students_marked": 0}
+
+    def reset(self):
+        """Forget all tracks (the camera was reopened)."""
+        self.tracker = FaceTracker(self.votes_required)
+        self._last_full_scan = None
+
+    @property
+    def tracking(self):
+        return len(self.tracker) > 0
+
+    @property
+    def identifying(self):
+        """True while some tracked face has no settled identity yet."""
+        return any(not t.decided for t in self.tracker.tracks)
+
+    def process(self, frame, seq, now=None, full_scan=None):
+        """Run one pass on frame number seq. Returns the overlay list (see snapshot())."""
+        now = time.time() if now is None else now
+        detector = get_detector(self.detector_backend)
+        if not len(self.tracker):
+            full_scan = True
+        elif full_scan is None:
+            full_scan = self._last_full_scan is None or seq - self._last_full_scan >= FULL_SCAN_INTERVAL
+        if full_scan:
+            boxes = list(detector.detect(frame))
+            self._last_full_scan = seq
+            self.stats["full_scans"] += 1
+        else:
+            boxes = self._detect_in_regions(detector, frame, seq)
+            self.stats["roi_passes"] += 1
+        self.stats["faces_detected"] += len(boxes)
+
+        seen = self.tracker.update(boxes, seq)
+        self._recognize(frame, [t for t in seen if t.needs_recognition(seq)], seq, now)
+
+        # forget per-minute keys older than 5 minutes
+        if now - self._last_cleanup > 5:
+            self.processed_faces = {k: v for k, v in self.processed_faces.items() if now - v < 300}
+            self._last_cleanup = now
+        return self.snapshot()
+
+    def _detect_in_regions(self, detector, frame, seq):
+        boxes = []
+        for track in self.tracker.tracks:
+            rx, ry, rw, rh = track.search_region(frame.shape, seq)
+            if rw == 0 or rh == 0:
+                continue
+            for (fx, fy, fw, fh) in detector.detect(frame[ry:ry + rh, rx:rx + rw]):
+                box = (rx + fx, ry + fy, fw, fh)
+                # neighbouring regions overlap; keep one box per face
+                if all(iou(box, b) < 0.5 for b in boxes):
+                    boxes.append(box)
+        return boxes
+
+    def _recognize(self, frame, tracks, seq, now):
+        pending, embs = [], []
+        for track in tracks:
+            try:
+                emb = embed_face(frame, track.box)
+            except Exception as e:
+                print(f"Face processing error: {e}")
+                emb = None
+            if emb is not None:
+                pending.append(track)
+                embs.append(emb)
+        if not embs:
+            return
+        error, predictions = recognize_embeddings(embs)
+        if error != self._last_error:
+            if error:
+                print(f"Recognition unavailable: {error}")
+            self._last_error = error
+        if error:
+            return
+        self.stats["faces_recognized"] += len(embs)
+        # recognize_embeddings already returns None for predictions below the
+        # backend's threshold, the same cut-off the HTTP routes use
+        for track, (student_id, confidence) in zip(pending, predictions):
+            track.add_vote(student_id, confidence, seq)
+            if track.identity is not None and track.marked_id != track.identity:
+                name = student_directory.get_name(track.identity) or f"Student {track.identity}"
+                self._mark(int(track.identity), name, now)
+                track.marked_id = track.identity
+
+    def snapshot(self):
+        """[{'bbox': (x1, y1, x2, y2), 'name', 'confidence', 'student_id', 'track_id', 'seq', 'velocity'}, ...]"""
+        detected = []
+        for track in self.tracker.tracks:
+            if track.identity is not None:
+                name = student_directory.get_name(track.identity) or f"Student {track.identity}"
+            elif track.decided:
+                name = "Unknown"
+            else:
+                name = "Identifying..."
+            x, y, w, h = track.box
+            detected.append({
+                'bbox': (x, y, x + w, y + h),
+                'name': name,
+                'confidence': track.confidence if track.identity is not None else 0.0,
+                'student_id': track.identity,
+                'track_id': track.id,
+                'seq': track.seq,
+                'velocity': track.velocity,
+            })
+        return detected
+
+    def _mark(self, student_id, name, now):
+        face_key = f"{student_id}_{int(now // 60)}"  # key per student per minute
+        if face_key in self.processed_faces:
+            return
+        self.processed_faces[face_key] = now
+        try:
+            if mark_attendance(student_id, name, self.attendance_date):
+                self.stats["students_marked"] += 1
+                print(f"Attendance marked for {name}")
+        except Exception as e:
+            print(f"Attendance marking error: {e}")
+
+
+def projected_bbox(face_info, seq=None):
+    """The face's (x1, y1, x2, y2) moved along its track's velocity up to frame seq."""
+    x1, y1, x2, y2 = face_info['bbox']
+    if seq is None or not face_info.get('velocity'):
+        return x1, y1, x2, y2
+    steps = min(max(seq - face_info['seq'], 0), MAX_EXTRAPOLATION)
+    dx, dy = int(face_info['velocity'][0] * steps), int(face_info['velocity'][1] * steps)
+    return x1 + dx, y1 + dy, x2 + dx, y2 + dy
+
+
+def draw_overlay(frame, detections, status_text, fps, seq=None):
+    """Draw tracked faces at their projected position for frame seq."""
+    for face_info in detections:
+        x1, y1, x2, y2 = projected_bbox(face_info, seq)
+        name = face_info['name']
+        confidence = face_info['confidence']
+
+        if face_info['student_id'] is not None:
+            color = (0, 255, 0)      # recognized
+            label = f"{name}: {confidence:.2f}"
+        elif name == "Unknown":
+            color = (0, 0, 255)      # decided: not enrolled
+            label = name
+        else:
+            color = (0, 200, 255)    # still collecting votes
+            label = name
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+        cv2.rectangle(frame, (x1, y1 - 25), (x1 + label_size[0], y1), color, -1)
+        cv2.putText(frame, label, (x1, y1 - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    cv2.putText(frame, f"FPS: {fps:.0f}", (10, frame.shape[0] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(frame, "CROWD MODE | LONG RANGE DETECTION", (10, frame.shape[0] - 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+
+class CameraBroadcaster:
+    """
+    Owns the camera and fans encoded frames out to any number of subscribers.
+
+    subscribe() starts the capture and detection threads if they are not
+    running; frames() yields (sequence, jpeg bytes) for one subscriber until it
+    unsubscribes or the source ends.
+    """
+
+    def __init__(self, source=CAMERA_SOURCE, pipeline=None):
+        self.source = _parse_source(source)
+        self.pipeline = pipeline or RecognitionPipeline()
+        self.scheduler = DetectionScheduler(CAMERA_FPS)
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self._last_unsubscribe = 0.0
+        self._running = False
+        self._threads = []
+        self._ring = deque(maxlen=RING_SIZE)  # (seq, frame)
+        self._seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._detections = []
+        self._fps = 0.0
+        self._stopping = False
+
+    @property
+    def subscribers(self):
+        with self._cond:
+            return self._subscribers
+
+    @property
+    def running(self):
+        with self._cond:
+            return self._running
+
+    def subscribe(self):
+        with self._cond:
+            self._subscribers += 1
+            # _running goes False as soon as the capture loop decides to stop
+            # (under this lock), so a subscriber arriving during shutdown restarts
+            if self._running:
+                return
+            previous = self._threads
+        # a previous capture may still be releasing the camera
+        for t in previous:
+            t.join(timeout=5)
+        with self._cond:
+            if not self._running and not self._stopping:
+                self._start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+            if self._subscribers == 0:
+                self._last_unsubscribe = time.monotonic()
+
+    def stop(self, timeout=5):
+        """Release the camera now, regardless of subscribers (used at exit)."""
+        with self._cond:
+            self._stopping = True
+            threads = self._threads
+            self._cond.notify_all()
+        for t in threads:
+            t.join(timeout=timeout)
+        with self._cond:
+            self._stopping = False
+
+    def _start(self):
+        # caller holds the lock
+        self._running = True
+        self._ring.clear()
+        self._jpeg = None
+        self._detections = []
+        self.pipeline.reset()
+        self.scheduler.reset()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True),
+            threading.Thread(target=self._detection_loop, name="camera-detection", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _should_stop(self):
+        # caller holds the lock
+        if self._stopping:
+            return True
+        return (self._subscribers == 0
+                and time.monotonic() - self._last_unsubscribe > IDLE_SHUTDOWN_SEC)
+
+    def _capture_loop(self):
+        cap = cv2.VideoCapture(self.source)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+        cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        # files and URLs are read as fast as they decode; pace them like a camera
+        pace = 1.0 / CAMERA_FPS if not isinstance(self.source, int) else 0.0
+        fps_window = deque(maxlen=CAMERA_FPS)
+        print(f"Camera {self.source!r} opened")
+        try:
+            while True:
+                with self._cond:
+                    if self._should_stop():
+                        # decided under the lock, so subscribe() never sees a
+                        # loop that is running but about to exit
+                        self._running = False
+                        self._cond.notify_all()
+                        break
+                started = time.monotonic()
+                success, frame = cap.read()
+                if not success:
+                    print("Camera read failed")
+                    break
+                fps_window.append(started)
+                fps = (len(fps_window) - 1) / (fps_window[-1] - fps_window[0]) if len(fps_window) > 1 else 0.0
+
+                with self._cond:
+                    seq = self._seq + 1
+                    detections = self._detections
+                self.scheduler.observe(frame, [projected_bbox(d, seq) for d in detections])
+                with self._cond:
+                    self._seq = seq
+                    self._ring.append((seq, frame))
+                    self._fps = fps
+                    self._cond.notify_all()  # wake the detection worker
+
+                # the ring buffer keeps the clean frame; overlays go on a copy
+                shown = frame.copy()
+                status = f"TRACKING ({len(detections)} faces)" if detections else "SCANNING"
+                status += f" | DET {self.scheduler.effective_rate():.1f}/s"
+                draw_overlay(shown, detections, status, fps, seq)
+                ok, buffer = cv2.imencode('.jpg', shown, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                if ok:
+                    with self._cond:
+                        self._jpeg = buffer.tobytes()
+                        self._jpeg_seq = seq
+                        self._cond.notify_all()
+
+                if pace:
+                    delay = pace - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as e:
+            print(f"Video capture error: {e}")
+        finally:
+            with self._cond:
+                # before the (possibly slow) release, so a new subscriber restarts
+                # instead of waiting on a dead loop; subscribe() joins this thread
+                # first. A late restart may already own the broadcaster if that
+                # join timed out.
+                if threading.current_thread() in self._threads:
+                    self._running = False
+                self._cond.notify_all()
+            cap.release()
+            print(f"Camera {self.source!r} released")
+
+    def _detection_loop(self):
+        kind = None
+        # build this thread's detector up front so its load time is not
+        # counted as detection latency by the scheduler
+        get_detector(self.pipeline.detector_backend)
+
+        def due():
+            # caller holds the lock
+            nonlocal kind
+            if not self._ring:
+                return False
+            kind = self.scheduler.decide(self._ring[-1][0], self.pipeline.tracking, self.pipeline.identifying)
+            return kind is not None
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or due(), timeout=1.0)
+                if not self._running:
+                    return
+                if kind is None:
+                    continue
+                seq, frame = self._ring[-1]
+                self.scheduler.started(seq, kind)
+            started = time.monotonic()
+            try:
+                detections = self.pipeline.process(frame, seq, full_scan=(kind == "full"))
+            except Exception as e:
+                print(f"Detection worker error: {e}")
+                detections = []
+            self.scheduler.finished(kind, time.monotonic() - started)
+            with self._cond:
+                self._detections = detections
+
+    def frames(self):
+        """Yields (sequence, jpeg bytes) for each new frame; the caller must be subscribed."""
+        last = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or (self._jpeg is not None and self._jpeg_seq > last),
+                                    timeout=5.0)
+                if self._jpeg_seq > last and self._jpeg is not None:
+                    last, jpeg = self._jpeg_seq, self._jpeg
+                elif not self._running:
+                    return
+                else:
+                    continue
+            yield last, jpeg
+
+
+    def stats(self):
+        with self._cond:
+            info = {
+                "running": self._running,
+                "subscribers": self._subscribers,
+                "capture_fps": round(self._fps, 2),
+                "frames_captured": self._seq,
+                "tracked_faces": len(self._detections),
+            }
+        info.update(self.scheduler.stats())
+        info.update(self.pipeline.stats)
+        return info
+
+
+broadcaster = CameraBroadcaster()
+atexit.register(broadcaster.stop)
+
+
+def _stream_metrics():
+    info = broadcaster.stats()
+
+    def seconds(ms):
+        return None if ms is None else ms / 1000.0
+
+    return [
+        ("stream_running", "gauge", "1 while the shared camera capture is running.",
+         [({}, int(info["running"]))]),
+        ("stream_subscribers", "gauge", "Connected /video_feed clients.", [({}, info["subscribers"])]),
+        ("stream_capture_fps", "gauge", "Frames per second read from the camera.", [({}, info["capture_fps"])]),
+        ("stream_detection_rate_hz", "gauge", "Detection passes per second chosen by the adaptive scheduler.",
+         [({}, info["detection_rate_hz"])]),
+        ("stream_detection_latency_seconds", "gauge",
+         "Smoothed detection + recognition time per pass, by pass kind.",
+         [({"kind": "full"}, seconds(info["latency_full_ms"])), ({"kind": "roi"}, seconds(info["latency_roi_ms"]))]),
+        ("stream_frames_captured_total", "counter", "Frames read from the camera.",
+         [({}, info["frames_captured"])]),
+        ("stream_detection_passes_total", "counter", "Detection passes by kind.",
+         [({"kind": "full"}, info["full_scans"]), ({"kind": "roi"}, info["roi_passes"])]),
+        ("stream_faces_detected_total", "counter", "Faces found by stream detection passes.",
+         [({}, info["faces_detected"])]),
+        ("stream_faces_classified_total", "counter", "Faces embedded and run through the classifier.",
+         [({}, info["faces_recognized"])]),
+    ]
+
+
+metrics_registry.add_collector(_stream_metrics)
 
-# Configure for crowd mode (long-range detection)
-face_detection = mp_face_detection.FaceDetection(
-    model_selection=1,  # Long-range model for detecting small faces
-    min_detection_confidence=0.5  # Balanced sensitivity for classroom environment
-)
 
 def generate_frames():
     """
-    Flask video streaming generator with Crowd Mode and Frame Skipping optimization.
-    
-    Features:
-    1. Crowd Mode: Uses MediaPipe with model_selection=1 for detecting small faces
-    2. Frame Skipping: Runs heavy detection only once every 30 frames (1 second)
-    3. Smooth streaming: Yields raw frames immediately on non-detection frames
-    
-    Returns:
-        Generator yielding JPEG encoded frames for Flask Response
+    multipart/x-mixed-replace generator for one /video_feed client. All clients
+    share the broadcaster's camera and detection worker.
     """
-    # Initialize camera
-    cap = cv2.VideoCapture(0)  # Use 0 for default camera, or camera index
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-    
-    # Frame counter for skipping logic
-    frame_counter = 0
-    DETECTION_INTERVAL = 30  # Run detection every 30 frames (~1 second at 30 FPS)
-    
-    # Load trained model for face recognition
-    from model import load_model_if_exists, predict_with_model
-    clf = load_model_if_exists()
-    
-    # Track recently detected faces to prevent duplicate processing
-    processed_faces = {}
-    last_cleanup_time = time.time()
-    
+    broadcaster.subscribe()
     try:
-        while True:
-            success, frame = cap.read()
-            if not success:
-                print("Camera read failed")
-                break
-            
-            frame_counter += 1
-            current_time = time.time()
-            
-            # ---------------- FRAME SKIPPING LOGIC ----------------
-            # Skip heavy face detection on most frames to maintain smooth video
-            should_detect = (frame_counter % DETECTION_INTERVAL == 0)
-            
-            if should_detect:
-                # HEAVY PROCESSING FRAME: Run face detection and recognition
-                print(f"Detection frame #{frame_counter}")  # Debug output
-                
-                # Convert BGR to RGB for MediaPipe
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Process frame with MediaPipe Face Detection
-                results = face_detection.process(rgb_frame)
-                
-                detected_faces = []
-                
-                if results.detections:
-                    for detection in results.detections:
-                        # Get bounding box coordinates
-                        bbox = detection.location_data.relative_bounding_box
-                        h, w, _ = frame.shape
-                        
-                        # Convert relative coordinates to absolute pixels
-                        x1 = int(bbox.xmin * w)
-                        y1 = int(bbox.ymin * h)
-                        x2 = int((bbox.xmin + bbox.width) * w)
-                        y2 = int((bbox.ymin + bbox.height) * h)
-                        
-                        # Ensure coordinates are within frame bounds
-                        x1 = max(0, x1)
-                        y1 = max(0, y1)
-                        x2 = min(w, x2)
-                        y2 = min(h, y2)
-                        
-                        if x2 > x1 and y2 > y1:
-                            # Extract face region
-                            face_roi = frame[y1:y2, x1:x2]
-                            
-                            if face_roi.size > 0:
-                                # Generate embedding for face recognition
-                                face_embedding = None
-                                try:
-                                    # Convert to grayscale and resize for model
-                                    face_gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-                                    face_resized = cv2.resize(face_gray, (32, 32), interpolation=cv2.INTER_AREA)
-                                    face_embedding = face_resized.flatten().astype(np.float32) / 255.0
-                                except Exception as e:
-                                    print(f"Face processing error: {e}")
-                                
-                                # Recognize face if model is available
-                                student_name = "Unknown"
-                                student_id = None
-                                confidence = 0.0
-                                
-                                if face_embedding is not None and clf is not None:
-                                    try:
-                                        student_id, confidence = predict_with_model(clf, face_embedding)
-                                        
-                                        # Get student name from database
-                                        if confidence > 0.5:  # Confidence threshold
-                                            import sqlite3
-                                            import os
-                                            APP_DIR = os.path.dirname(os.path.abspath(__file__))
-                                            DB_PATH = os.path.join(APP_DIR, "attendance.db")
-                                            
-                                            conn = sqlite3.connect(DB_PATH)
-                                            c = conn.cursor()
-                                            c.execute("SELECT name FROM students WHERE id=?", (int(student_id),))
-                                            row = c.fetchone()
-                                            student_name = row[0] if row else f"Student {student_id}"
-                                            conn.close()
-                                    except Exception as e:
-                                        print(f"Recognition error: {e}")
-                                
-                                # Store face info for drawing
-                                detected_faces.append({
-                                    'bbox': (x1, y1, x2, y2),
-                                    'name': student_name,
-                                    'confidence': confidence,
-                                    'student_id': student_id
-                                })
-                                
-                                # Mark attendance if recognized and not recently processed
-                                if student_id and confidence > 0.5:
-                                    face_key = f"{student_id}_{int(current_time // 60)}"  # Key per student per minute
-                                    if face_key not in processed_faces:
-                                        try:
-                                            from attendance_utils import mark_attendance
-                                            attendance_marked = mark_attendance(int(student_id), student_name)
-                                            if attendance_marked:
-                                                print(f"Attendance marked for {student_name}")
-                                        except Exception as e:
-                                            print(f"Attendance marking error: {e}")
-                                        
-                                        processed_faces[face_key] = current_time
-                
-                # Draw bounding boxes and labels on frame
-                for face_info in detected_faces:
-                    x1, y1, x2, y2 = face_info['bbox']
-                    name = face_info['name']
-                    confidence = face_info['confidence']
-                    
-                    # Draw bounding box
-                    color = (0, 255, 0) if confidence > 0.5 else (0, 0, 255)  # Green for recognized, red for unknown
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    
-                    # Draw label with name and confidence
-                    label = f"{name}: {confidence:.2f}"
-                    label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                    cv2.rectangle(frame, (x1, y1 - 25), (x1 + label_size[0], y1), color, -1)
-                    cv2.putText(frame, label, (x1, y1 - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-                
-                # Add detection indicator
-                cv2.putText(frame, f"DETECTING ({len(detected_faces)} faces)", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            else:
-                # ---------------- SKIP FRAME LOGIC ----------------
-                # LIGHTWEIGHT FRAME: Skip detection, just yield raw frame for smooth video
-                # This prevents lag by not running heavy MediaPipe + recognition on every frame
-                
-                # Add frame skip indicator
-                cv2.putText(frame, f"STREAMING (frame {frame_counter % DETECTION_INTERVAL}/{DETECTION_INTERVAL})", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-            
-            # Clean up old face entries every 5 seconds
-            if current_time - last_cleanup_time > 5:
-                processed_faces = {k: v for k, v in processed_faces.items() if current_time - v < 300}  # Keep 5 minutes
-                last_cleanup_time = current_time
-            
-            # Add frame info
-            fps_text = f"FPS: {int(cap.get(cv2.CAP_PROP_FPS))}"
-            cv2.putText(frame, fps_text, (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            # Add mode indicator
-            mode_text = "CROWD MODE | LONG RANGE DETECTION"
-            cv2.putText(frame, mode_text, (10, frame.shape[0] - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-            
-            # Encode frame to JPEG
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_bytes = buffer.tobytes()
-            
-            # Yield frame for Flask streaming
+        for _, frame_bytes in broadcaster.frames():
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-    except Exception as e:
-        print(f"Video streaming error: {e}")
     finally:
-        # Cleanup
-        cap.release()
-        face_detection.close()
+        broadcaster.unsubscribe()
+
 
-# Flask route for video streaming
-@app.route('/video_feed')
+video_bp = Blueprint("video", __name__)
+
+
+@video_bp.route('/video_feed')
 def video_feed():
-    """Video streaming route with optimized crowd mode and frame skipping."""
+    """Live MJPEG stream with face boxes; shared by every connected client."""
     return Response(generate_frames(),
-                   mimetype='multipart/x-mixed-replace; boundary=frame')
\ No newline at end of file
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@video_bp.route('/video_feed/stats')
+def video_feed_stats():
+    """Capture rate, effective detection rate, pass latencies and pass counters."""
+    return jsonify(broadcaster.stats())